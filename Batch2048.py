@@ -0,0 +1,220 @@
+import numpy as np
+
+import Bitboard
+from Game2048 import Game2048
+
+# Batched version of the Game2048 rules.  N boards are held as an (N,16)
+# uint8 array of tile exponents in the same cell order as Game2048._board,
+# and every operation works on all of them at once through the row tables
+# in Bitboard.py, so the results match Game2048.move() exactly.
+#
+# Actions are given as integer codes indexing 'UDLR'.
+
+ACTIONS = 'UDLR'
+
+_ROW_LEFT = np.array(Bitboard.ROW_LEFT, dtype=np.uint16)
+_ROW_RIGHT = np.array(Bitboard.ROW_RIGHT, dtype=np.uint16)
+_SCORE_LEFT = np.array(Bitboard.SCORE_LEFT, dtype=np.int64)
+_SCORE_RIGHT = np.array(Bitboard.SCORE_RIGHT, dtype=np.int64)
+_ROW_CAN_MOVE = np.array(Bitboard.ROW_CAN_MOVE, dtype=np.uint8)
+
+_WIN_LEFT = np.zeros(65536, dtype=bool)
+_WIN_LEFT[list(Bitboard.WIN_LEFT)] = True
+_WIN_RIGHT = np.zeros(65536, dtype=bool)
+_WIN_RIGHT[list(Bitboard.WIN_RIGHT)] = True
+
+_SHIFTS = np.array([0, 4, 8, 12], dtype=np.uint16)
+
+# Action code, whether to move the columns instead of the rows, and tables
+_LEFT_TABLES = (_ROW_LEFT, _SCORE_LEFT, _WIN_LEFT)
+_RIGHT_TABLES = (_ROW_RIGHT, _SCORE_RIGHT, _WIN_RIGHT)
+_DIRECTIONS = [ (0, True, _LEFT_TABLES), (1, True, _RIGHT_TABLES),
+	(2, False, _LEFT_TABLES), (3, False, _RIGHT_TABLES) ]
+
+def streamRng(seed, stream=0):
+	# Counter based numpy generator for one (seed, stream) pair, the batch
+	# counterpart of Game2048.setSeed()
+	return np.random.Generator(np.random.Philox(key=((stream & 0xFFFFFFFFFFFFFFFF) << 64) | (seed & 0xFFFFFFFFFFFFFFFF)))
+
+def actionCodes(actions):
+	# 'UDLR' string (one letter per board) to an array of action codes
+	return np.array([ ACTIONS.index(a) for a in actions ], dtype=np.int8)
+
+def _rowIndex(cells):
+	# (...,4) exponents to the 16-bit row used to index the tables
+	cells = cells.astype(np.uint16)
+	return cells[...,0] | (cells[...,1] << 4) | (cells[...,2] << 8) | (cells[...,3] << 12)
+
+def _rowCells(rows):
+	return ((rows[...,None] >> _SHIFTS) & 0xF).astype(np.uint8)
+
+def _slide(grid, rowTable, scoreTable, winTable):
+	# grid is (M,4,4), the rows of each board are moved towards column 0
+	# for the left tables or column 3 for the right tables
+	idx = _rowIndex(grid)
+	return _rowCells(rowTable[idx]), scoreTable[idx].sum(axis=1), winTable[idx].any(axis=1)
+
+def moveBoards(boards, actions):
+	# Returns the afterstates, the score gained and whether the move merged
+	# two 32768 tiles, for each board with its own action.  Boards with an
+	# action code outside 0-3 are left as they are.
+	boards = np.asarray(boards, dtype=np.uint8)
+	actions = np.asarray(actions)
+	n = len(boards)
+	result = boards.copy()
+	gained = np.zeros(n, dtype=np.int64)
+	won = np.zeros(n, dtype=bool)
+	grid = boards.reshape(n, 4, 4)
+	out = result.reshape(n, 4, 4)
+
+	for code, transposed, tables in _DIRECTIONS:
+		sel = np.nonzero(actions == code)[0]
+		if len(sel) == 0:
+			continue
+		g = grid[sel]
+		if transposed:
+			g = g.transpose(0, 2, 1)
+		moved, s, w = _slide(g, *tables)
+		if transposed:
+			moved = moved.transpose(0, 2, 1)
+		out[sel] = moved
+		gained[sel] = s
+		won[sel] = w
+
+	return result, gained, won
+
+def legalMoves(boards):
+	# Legal move bitmask per board, same bits as Bitboard.legalMoves()
+	grid = np.asarray(boards, dtype=np.uint8).reshape(-1, 4, 4)
+	horizontal = np.bitwise_or.reduce(_ROW_CAN_MOVE[_rowIndex(grid)], axis=1)
+	vertical = np.bitwise_or.reduce(_ROW_CAN_MOVE[_rowIndex(grid.transpose(0, 2, 1))], axis=1)
+	return vertical | (horizontal << 2)
+
+def spawnTiles(boards, rng, where=None):
+	# Adds a tile in place to every board (or every board selected by the
+	# where mask) that has an empty cell: the cell is uniform over the empty
+	# cells and the tile is a 4 one time in four, the same distribution as
+	# Game2048.result()
+	empty = boards == 0
+	counts = empty.sum(axis=1)
+	if where is not None:
+		counts[~where] = 0
+	rows = np.nonzero(counts)[0]
+	if len(rows) == 0:
+		return
+	pick = (rng.random(len(rows)) * counts[rows]).astype(np.int64)
+	# Position of the pick-th empty cell in each board
+	rank = np.cumsum(empty[rows], axis=1) - 1
+	cells = np.argmax(empty[rows] & (rank == pick[:,None]), axis=1)
+	tiles = np.where(rng.integers(0, 4, len(rows)) == 3, 2, 1).astype(np.uint8)
+	boards[rows, cells] = tiles
+
+# Starting tile distribution of Game2048.randomize()
+_START_TILES = np.array([0]*16 + [1]*4 + [2]*2 + [3], dtype=np.uint8)
+
+def randomBoards(n, rng):
+	# n fresh boards drawn like Game2048.randomize()
+	return rng.choice(_START_TILES, size=(n, 16))
+
+def randomLegalActions(legal, rng):
+	# A uniformly chosen legal action code per legal move mask, -1 where
+	# there is none.  The four actions are ranked by random keys and the
+	# best legal one is kept.
+	keys = np.where((legal[:,None] >> np.arange(4)) & 1, rng.random((len(legal), 4)), -1.0)
+	actions = np.argmax(keys, axis=1)
+	actions[legal == 0] = -1
+	return actions
+
+class BatchGame2048:
+	def __init__(self, boards, scores=None, rng=None):
+		self._boards = np.array(boards, dtype=np.uint8).reshape(-1, 16)
+		n = len(self._boards)
+		if scores is None:
+			self._scores = np.zeros(n, dtype=np.int64)
+		else:
+			self._scores = np.array(scores, dtype=np.int64)
+		self._won = np.zeros(n, dtype=bool)
+		if rng is None:
+			rng = np.random.default_rng()
+		self._rng = rng
+
+	@staticmethod
+	def fromGames(games, rng=None):
+		batch = BatchGame2048([ g._board for g in games ], [ g.getScore() for g in games ], rng)
+		batch._won = np.array([ g._won for g in games ], dtype=bool)
+		return batch
+
+	def toGames(self):
+		games = []
+		for i in range(len(self._boards)):
+			g = Game2048(self._boards[i].tolist(), int(self._scores[i]))
+			g._won = bool(self._won[i])
+			games.append(g)
+		return games
+
+	def __len__(self):
+		return len(self._boards)
+
+	def getScores(self):
+		return self._scores
+
+	def legalMask(self):
+		return legalMoves(self._boards)
+
+	def gameOver(self):
+		return self._won | (legalMoves(self._boards) == 0)
+
+	def move(self, actions):
+		# Moves every board in place and returns the score gained by each
+		self._boards, gained, won = moveBoards(self._boards, actions)
+		self._scores += gained
+		self._won |= won
+		return gained
+
+	def result(self, actions):
+		# Moves every board, then spawns a random tile on each board the move
+		# changed.  Boards whose action was illegal are left as they were.
+		before = self._boards
+		gained = self.move(actions)
+		spawnTiles(self._boards, self._rng, (self._boards != before).any(axis=1))
+		return gained
+
+class GameBatch(BatchGame2048):
+	# N independent games for self-play and benchmarking.  step() plays one
+	# action in every game, and a game that ends is recorded and restarted
+	# in its slot with a fresh randomize() board, so the batch always holds
+	# N live games.
+	def __init__(self, n, rng=None):
+		BatchGame2048.__init__(self, np.zeros((n, 16)), None, rng)
+		self._finishedScores = []
+		self._finishedTiles = []
+		self._restart(np.arange(n))
+
+	def _restart(self, slots):
+		while len(slots):
+			self._boards[slots] = randomBoards(len(slots), self._rng)
+			self._scores[slots] = 0
+			self._won[slots] = False
+			# randomize() can deal a board with no moves, deal those again
+			slots = slots[legalMoves(self._boards[slots]) == 0]
+
+	def step(self, actions):
+		# Returns the reward of every game and which games ended on this
+		# step.  An illegal action leaves its game unchanged with reward 0.
+		rewards = self.result(actions)
+		done = self.gameOver()
+		slots = np.nonzero(done)[0]
+		if len(slots):
+			self._finishedScores.extend(self._scores[slots].tolist())
+			self._finishedTiles.extend(self._boards[slots].max(axis=1).tolist())
+			self._restart(slots)
+		return rewards, done
+
+	def randomActions(self):
+		return randomLegalActions(self.legalMask(), self._rng)
+
+	def finishedScores(self):
+		return self._finishedScores
+
+	def finishedMaxTiles(self):
+		return self._finishedTiles
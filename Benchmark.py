@@ -0,0 +1,311 @@
+from Game2048 import *
+
+import argparse, time
+
+def midGameBoards(count, seed=2048, moves=150):
+	# A fixed set of boards reached by random play, so runs are comparable.
+	# Game n spawns its tiles from stream n of seed and picks its moves with
+	# its own Random, so the global random module is left alone.
+	boards = []
+	n = 0
+	while len(boards) < count:
+		state = Game2048()
+		state.setSeed(seed, n)
+		state.randomize()
+		choices = random.Random(f'{seed}/{n}')
+		for i in range(moves):
+			if state.gameOver():
+				break
+			state, reward = state.result(choices.choice(state.actions()))
+		if not state.gameOver():
+			boards.append(state)
+		n += 1
+	return boards
+
+def timeIt(f, boards, repeats):
+	# Returns nodes per second, f(board) returns the number of nodes it made
+	nodes = 0
+	start = time.perf_counter()
+	for r in range(repeats):
+		for b in boards:
+			nodes += f(b)
+	return nodes / (time.perf_counter() - start)
+
+def benchMoves(boards, repeats):
+	# Every move from every board on the original list engine and on the
+	# packed engine: raw Bitboard functions, the in-place API and move().
+	# The target is 5x the list engine.  The Bitboard functions and the in
+	# place API are the fast path and meet it; move() also builds a new
+	# state for every move and measures about 4-5x.
+	from ListGame2048 import ListGame2048
+
+	lists = [ ListGame2048(b._board, b.getScore()) for b in boards ]
+	packed = [ b._b for b in boards ]
+	moves = [ Bitboard.MOVES[a] for a in 'UDLR' ]
+
+	def listMove(g):
+		for a in 'UDLR':
+			g.move(a)
+		return 4
+
+	def rawMove(b):
+		for f in moves:
+			f(b)
+		return 4
+
+	def inPlace(g):
+		for a in 'UDLR':
+			g.undo(g.applyMove(a))
+		return 4
+
+	def fresh(g):
+		g._after = None
+		for a in 'UDLR':
+			g.move(a)
+		return 4
+
+	# Rounds alternate between the engines and each keeps its best round,
+	# so a slow patch on the machine does not skew the ratios
+	engines = (('ListGame2048.move', listMove, lists),
+		('Bitboard move functions', rawMove, packed),
+		('applyMove + undo', inPlace, [ b.copy() for b in boards ]),
+		('Game2048.move', fresh, [ b.copy() for b in boards ]))
+	rates = [0] * len(engines)
+	for r in range(5):
+		for i, (name, f, states) in enumerate(engines):
+			rates[i] = max(rates[i], timeIt(f, states, max(1, repeats // 5)))
+
+	print('Moves (moves/sec, speedup over the list engine, 5x target)')
+	for (name, f, states), rate in zip(engines, rates):
+		speedup = rate / rates[0]
+		target = '' if f is listMove else 'met' if speedup >= 5 else 'missed'
+		print(f'\t{name:24s}  {rate:12,.0f} {speedup:6.1f}x  {target}')
+
+def chanceLayerAddTile(state):
+	n = 0
+	for (t,v) in state.possibleTiles():
+		state.addTile(t,v)
+		n += 1
+	return n
+
+def chanceLayerChildren(state):
+	n = 0
+	for (t,v,p,g) in state.chanceChildren():
+		n += 1
+	return n
+
+def benchChanceLayer(boards, repeats):
+	# The reference is the original list engine, whose addTile() deep
+	# copies the state for every child
+	from ListGame2048 import ListGame2048
+
+	lists = [ ListGame2048(b._board, b.getScore()) for b in boards ]
+	base = timeIt(chanceLayerAddTile, lists, repeats)
+	print('Chance layer (nodes/sec, speedup over the list engine)')
+	print(f'\tListGame2048 deepcopy    {base:12,.0f}')
+	for name, f in (('possibleTiles + addTile', chanceLayerAddTile), ('chanceChildren', chanceLayerChildren)):
+		rate = timeIt(f, boards, repeats)
+		print(f'\t{name:24s} {rate:12,.0f} {rate/base:6.1f}x')
+
+def randomMoves(newGame, seconds):
+	# Moves per second from random play, newGame() makes an empty game
+	rng = random.Random(1)
+	state = newGame()
+	start = time.perf_counter()
+	moves = 0
+	while time.perf_counter() - start < seconds:
+		while state.gameOver():
+			state = newGame()
+			state.randomize()
+		for a in 'UDLR':
+			state.move(a)
+		state, reward = state.result(rng.choice(state.actions()))
+		moves += 5
+	return moves / (time.perf_counter() - start)
+
+def benchVariants(seconds, boards, repeats):
+	from Game2048Variant import Game2048Variant, Rules
+
+	# Random play keeps meeting new rows, so on 5x5 and 6x6 it mostly
+	# measures filling the row tables
+	print('Random play (moves/sec, per cell)')
+	rate = randomMoves(Game2048, seconds)
+	print(f'\tGame2048 4x4              {rate:12,.0f} {rate*16:12,.0f}')
+	for size in (4, 5, 6):
+		rules = Rules(size)
+		rate = randomMoves(lambda: Game2048Variant(rules), seconds)
+		print(f'\tGame2048Variant {size}x{size}       {rate:12,.0f} {rate*size*size:12,.0f}')
+
+	# A search revisits the same rows: every move from a fixed set of
+	# mid-game boards, repeated
+	def allMoves(g):
+		g._after = None
+		for a in 'UDLR':
+			g.move(a)
+		return 4
+
+	print('Moves from mid-game boards (moves/sec, per cell)')
+	rate = timeIt(allMoves, [ b.copy() for b in boards ], repeats)
+	print(f'\tGame2048 4x4              {rate:12,.0f} {rate*16:12,.0f}')
+	for size in (4, 5, 6):
+		rules = Rules(size)
+		states = []
+		rng = random.Random(size)
+		while len(states) < len(boards):
+			state = Game2048Variant(rules, rng=rng)
+			state.randomize()
+			for i in range(40*size):
+				if state.gameOver():
+					break
+				state, reward = state.result(rng.choice(state.actions()))
+			if not state.gameOver():
+				states.append(state)
+		rate = timeIt(allMoves, states, repeats)
+		print(f'\tGame2048Variant {size}x{size}       {rate:12,.0f} {rate*size*size:12,.0f}')
+
+def searchTime(boards, depth):
+	import MyAgent
+	agent = MyAgent.Player(1e9, tableBytes=0)
+	agent._startTime = time.time()
+	start = time.perf_counter()
+	for b in boards:
+		agent.maxPlayer(b, depth)
+	return time.perf_counter() - start, agent._nodeCount
+
+def benchMoveCache(boards, depths, size):
+	# Fixed depth MyAgent searches with the move cache off and on.  Boards
+	# are copied so afterstates cached on the states are not reused.
+	print(f'MyAgent search with move cache of {size} boards')
+	for depth in depths:
+		disableMoveCache()
+		off, nodes = searchTime([ b.copy() for b in boards ], depth)
+		enableMoveCache(size)
+		on, nodes = searchTime([ b.copy() for b in boards ], depth)
+		info = moveCacheInfo()
+		disableMoveCache()
+		print(f'\tdepth {depth}  {off:7.2f}s off  {on:7.2f}s on  '
+			f'hit rate {info.hits / max(1, info.hits + info.misses):.1%}  ({nodes:,} nodes)')
+
+def benchSearchModes(boards, timeLimit, depth):
+	# MyAgent in each search mode with and without the probability cutoff,
+	# without a transposition table:
+	# nodes for a fixed depth search, then one timed move per board
+	import MyAgent
+
+	print(f'MyAgent search modes (depth {depth}, then {timeLimit}s per move)')
+	for mode in ('minimax', 'expectimax'):
+		for cutoff in (0, 1e-4, 1e-3):
+			agent = MyAgent.Player(1e9, mode, cutoff, tableBytes=0)
+			agent._startTime = time.time()
+			for b in boards:
+				agent.maxPlayer(b.copy(), depth)
+			nodes = agent._nodeCount
+
+			agent = MyAgent.Player(timeLimit, mode, cutoff, tableBytes=0)
+			for b in boards:
+				agent._startTime = time.time()
+				agent.findMove(b.copy())
+			print(f'\t{mode:10s} cutoff {cutoff:<6g} {nodes:12,} nodes  '
+				f'{agent._nodeCount / agent._searchTime:10,.0f} nodes/sec  '
+				f'depth {agent._reachedDepth / agent._count:.2f} average, {agent._maxDepth} max')
+
+def benchTranspositionTable(boards, depths, tableBytes):
+	# Fixed depth expectimax searches with the transposition table off and on
+	import MyAgent
+
+	print(f'MyAgent transposition table of {tableBytes >> 20} MB')
+	for depth in depths:
+		line = f'\tdepth {depth}'
+		for size in (0, tableBytes):
+			agent = MyAgent.Player(1e9, 'expectimax', 0, size)
+			agent._startTime = time.time()
+			start = time.perf_counter()
+			for b in boards:
+				agent.maxPlayer(b.copy(), depth)
+			line += f'  {time.perf_counter() - start:7.2f}s {agent._nodeCount:10,} nodes'
+		line += f'  hit rate {agent._table.hitRate():.1%}'
+		print(line)
+
+def benchTableReuse(moves, timeLimit, seed=2048):
+	# A seeded expectimax game, with the transposition table kept between
+	# moves and with it cleared before every move
+	import MyAgent
+
+	print(f'MyAgent table kept between moves ({moves} moves, {timeLimit}s per move)')
+	for keep in (False, True):
+		agent = MyAgent.Player(timeLimit, 'expectimax')
+		state = Game2048()
+		state.setSeed(seed)
+		state.randomize()
+		for i in range(moves):
+			if state.gameOver():
+				break
+			if not keep:
+				agent._table.clear()
+			agent._startTime = time.time()
+			agent.findMove(state)
+			state, reward = state.result(agent.getMove())
+		rates = agent._moveHitRates
+		print(f'\t{"kept" if keep else "cleared":8s}  depth {agent._reachedDepth / agent._count:.2f} average  '
+			f'hit rate {sum(rates) / len(rates):.1%} per move  score {state.getScore()}')
+
+def benchDeadline(boards, depth, timeLimit):
+	# Cost of checking the clock in a fixed depth MyAgent search, every node
+	# and every _checkInterval nodes against never, then how far timed
+	# searches run past their limit
+	import MyAgent
+
+	print(f'MyAgent deadline checks (depth {depth}, then {timeLimit}s per move)')
+	times = {}
+	for interval in (10**12, 1, 256) * 3:
+		agent = MyAgent.Player(1e9, 'expectimax', 0, 0)
+		agent._checkInterval = interval
+		agent._startTime = time.time()
+		agent.startClock()
+		start = time.perf_counter()
+		for b in boards:
+			agent.maxPlayer(b.copy(), depth)
+		times[interval] = min(times.get(interval, 1e9), time.perf_counter() - start)
+	never = times[10**12]
+	for interval, name in ((1, 'every node'), (256, 'every 256 nodes')):
+		print(f'\t{name:16s} {times[interval]:7.2f}s  {times[interval] / never - 1:6.1%} over never checking')
+
+	agent = MyAgent.Player(timeLimit, 'expectimax')
+	over = []
+	for b in boards:
+		agent._startTime = time.time()
+		agent.findMove(b.copy())
+		over.append(time.time() - agent._startTime - timeLimit)
+	print(f'\tpast the limit   {sum(over) / len(over) * 1000:7.2f}ms average  {max(over) * 1000:.2f}ms max')
+
+def benchRollouts(count):
+	import Rollout
+
+	print(f'Random rollouts from an opening board ({count} playouts)')
+	state = Game2048([1,0,0,0, 0,0,1,0] + [0]*8)
+	for batch in (False, True):
+		start = time.perf_counter()
+		r = Rollout.rollouts(state, count, rng=None if batch else random.Random(1), batch=batch)
+		rate = sum(r.lengths) / (time.perf_counter() - start)
+		print(f'\t{"NumPy batch" if batch else "packed boards":24s} {rate:12,.0f} moves/sec  mean score {r.meanScore():.0f}')
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description ='Benchmark the 2048 engine')
+	parser.add_argument('-n', type=int, default=200, help="number of boards")
+	parser.add_argument('-r', type=int, default=20, help="repetitions")
+	parser.add_argument('-s', type=float, default=2, help="seconds per timed run")
+	parser.add_argument('-c', type=int, default=100000, help="move cache size")
+	parser.add_argument('-t', type=float, default=0.2, help="time limit per searched move")
+	parser.add_argument('-m', type=int, default=32, help="transposition table size in MB")
+	args = parser.parse_args()
+
+	boards = midGameBoards(args.n)
+	benchMoves(boards, args.r)
+	benchChanceLayer(boards, args.r)
+	benchVariants(args.s, boards, args.r)
+	benchMoveCache(boards[:10], (3, 5, 7), args.c)
+	benchSearchModes(boards[:10], args.t, 7)
+	benchTranspositionTable(boards[:10], (4, 6, 8), args.m << 20)
+	benchTableReuse(100, args.t)
+	benchDeadline(boards[:10], 6, args.t)
+	benchRollouts(1000)
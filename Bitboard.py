@@ -0,0 +1,233 @@
+# Packed 4x4 board: the exponent of cell i = 4*r + c lives in the nibble at
+# bit 4*i, so row r is the 16-bit word at bit 16*r with column 0 in its low
+# nibble.  Moves are table lookups on whole rows; up and down are done by
+# transposing so the columns become rows.
+
+ROW_MASK = 0xFFFF
+WIN_TILE = 16
+MAX_NIBBLE = 15
+
+def _unpackRow(row):
+	return [ (row >> (4*c)) & 0xF for c in range(4) ]
+
+def _packRow(cells):
+	row = 0
+	for c in range(4):
+		row |= cells[c] << (4*c)
+	return row
+
+def _slideLeft(cells):
+	# Same merge rule as the original list based Game2048.move('L')
+	compressed = [t for t in cells if t != 0]
+	j = 0
+	r = []
+	score = 0
+	won = False
+	while j < len(compressed):
+		if j < len(compressed)-1 and compressed[j] == compressed[j+1]:
+			score += 2*(2**compressed[j])
+			if compressed[j] + 1 >= WIN_TILE:
+				# A 65536 tile does not fit in a nibble, saturate and flag it
+				won = True
+				r.append(MAX_NIBBLE)
+			else:
+				r.append(compressed[j]+1)
+			j += 2
+		else:
+			r.append(compressed[j])
+			j += 1
+	return r + [0] * (4-len(r)), score, won
+
+# The 4 exponents of every row as a tuple, for tables keyed by row tuples
+ROW_TUPLES = [ tuple((row >> (4*c)) & 0xF for c in range(4)) for row in range(65536) ]
+
+ROW_LEFT = [0] * 65536
+ROW_RIGHT = [0] * 65536
+SCORE_LEFT = [0] * 65536
+SCORE_RIGHT = [0] * 65536
+WIN_LEFT = set()
+WIN_RIGHT = set()
+
+# Bit 0 set if the row changes when moved left, bit 1 if it changes when
+# moved right.
+ROW_CAN_MOVE = [0] * 65536
+
+def _buildTables():
+	for row in range(65536):
+		cells = _unpackRow(row)
+
+		result, score, won = _slideLeft(cells)
+		ROW_LEFT[row] = _packRow(result)
+		SCORE_LEFT[row] = score
+		if won:
+			WIN_LEFT.add(row)
+
+		result, score, won = _slideLeft(cells[::-1])
+		ROW_RIGHT[row] = _packRow(result[::-1])
+		SCORE_RIGHT[row] = score
+		if won:
+			WIN_RIGHT.add(row)
+
+		ROW_CAN_MOVE[row] = (ROW_LEFT[row] != row) | ((ROW_RIGHT[row] != row) << 1)
+
+_buildTables()
+
+def pack(cells):
+	b = 0
+	for i in range(16):
+		b |= min(cells[i], MAX_NIBBLE) << (4*i)
+	return b
+
+def unpack(b):
+	return [ (b >> (4*i)) & 0xF for i in range(16) ]
+
+# SPREAD puts the nibbles of a row one per row in a column, so a board is
+# transposed with four lookups.
+SPREAD = [ (row & 0xF) | (((row >> 4) & 0xF) << 16) | (((row >> 8) & 0xF) << 32) | ((row >> 12) << 48)
+	for row in range(65536) ]
+
+def transpose(b):
+	return (SPREAD[b & ROW_MASK] | (SPREAD[(b >> 16) & ROW_MASK] << 4)
+		| (SPREAD[(b >> 32) & ROW_MASK] << 8) | (SPREAD[b >> 48] << 12))
+
+def flipHorizontal(b):
+	# Mirror left to right, column c goes to column 3-c
+	return (((b & 0x000F000F000F000F) << 12) | ((b & 0x00F000F000F000F0) << 4)
+		| ((b & 0x0F000F000F000F00) >> 4) | ((b & 0xF000F000F000F000) >> 12))
+
+def flipVertical(b):
+	# Mirror top to bottom, row r goes to row 3-r
+	return ((b & ROW_MASK) << 48) | ((b & 0xFFFF0000) << 16) | ((b >> 16) & 0xFFFF0000) | (b >> 48)
+
+def rotate(b, numRotations):
+	# Quarter turns clockwise, cell (r,c) goes to (c,3-r) for each turn
+	numRotations = numRotations % 4
+	if numRotations == 0:
+		return b
+	if numRotations == 1:
+		return flipHorizontal(transpose(b))
+	if numRotations == 2:
+		return flipHorizontal(flipVertical(b))
+	return flipVertical(transpose(b))
+
+def symmetries(b):
+	# The 8 boards related to b by rotations and reflections, b first
+	h = flipHorizontal(b)
+	v = flipVertical(b)
+	hv = flipVertical(h)
+	t = transpose(b)
+	return [ b, h, v, hv, t, transpose(h), transpose(v), transpose(hv) ]
+
+def canonical(b):
+	# The same key for all 8 symmetric versions of a board
+	return min(symmetries(b))
+
+def moveLeft(b):
+	r0 = b & ROW_MASK
+	r1 = (b >> 16) & ROW_MASK
+	r2 = (b >> 32) & ROW_MASK
+	r3 = b >> 48
+	return (ROW_LEFT[r0] | (ROW_LEFT[r1] << 16) | (ROW_LEFT[r2] << 32) | (ROW_LEFT[r3] << 48),
+		SCORE_LEFT[r0] + SCORE_LEFT[r1] + SCORE_LEFT[r2] + SCORE_LEFT[r3])
+
+def moveRight(b):
+	r0 = b & ROW_MASK
+	r1 = (b >> 16) & ROW_MASK
+	r2 = (b >> 32) & ROW_MASK
+	r3 = b >> 48
+	return (ROW_RIGHT[r0] | (ROW_RIGHT[r1] << 16) | (ROW_RIGHT[r2] << 32) | (ROW_RIGHT[r3] << 48),
+		SCORE_RIGHT[r0] + SCORE_RIGHT[r1] + SCORE_RIGHT[r2] + SCORE_RIGHT[r3])
+
+# Up and down use the columns as rows: COL_UP/COL_DOWN hold the moved row
+# already spread back into a column (see SPREAD).
+COL_UP = [ SPREAD[row] for row in ROW_LEFT ]
+COL_DOWN = [ SPREAD[row] for row in ROW_RIGHT ]
+
+def moveUp(b):
+	t = (SPREAD[b & ROW_MASK] | (SPREAD[(b >> 16) & ROW_MASK] << 4)
+		| (SPREAD[(b >> 32) & ROW_MASK] << 8) | (SPREAD[b >> 48] << 12))
+	c0 = t & ROW_MASK
+	c1 = (t >> 16) & ROW_MASK
+	c2 = (t >> 32) & ROW_MASK
+	c3 = t >> 48
+	return (COL_UP[c0] | (COL_UP[c1] << 4) | (COL_UP[c2] << 8) | (COL_UP[c3] << 12),
+		SCORE_LEFT[c0] + SCORE_LEFT[c1] + SCORE_LEFT[c2] + SCORE_LEFT[c3])
+
+def moveDown(b):
+	t = (SPREAD[b & ROW_MASK] | (SPREAD[(b >> 16) & ROW_MASK] << 4)
+		| (SPREAD[(b >> 32) & ROW_MASK] << 8) | (SPREAD[b >> 48] << 12))
+	c0 = t & ROW_MASK
+	c1 = (t >> 16) & ROW_MASK
+	c2 = (t >> 32) & ROW_MASK
+	c3 = t >> 48
+	return (COL_DOWN[c0] | (COL_DOWN[c1] << 4) | (COL_DOWN[c2] << 8) | (COL_DOWN[c3] << 12),
+		SCORE_RIGHT[c0] + SCORE_RIGHT[c1] + SCORE_RIGHT[c2] + SCORE_RIGHT[c3])
+
+MOVES = { 'U': moveUp, 'D': moveDown, 'L': moveLeft, 'R': moveRight }
+
+def allMoves(b):
+	# (board, score) for U, D, L and R, extracting the rows once for both
+	# horizontal moves and the columns once for both vertical moves
+	r0 = b & ROW_MASK
+	r1 = (b >> 16) & ROW_MASK
+	r2 = (b >> 32) & ROW_MASK
+	r3 = b >> 48
+	t = SPREAD[r0] | (SPREAD[r1] << 4) | (SPREAD[r2] << 8) | (SPREAD[r3] << 12)
+	c0 = t & ROW_MASK
+	c1 = (t >> 16) & ROW_MASK
+	c2 = (t >> 32) & ROW_MASK
+	c3 = t >> 48
+	return [
+		(COL_UP[c0] | (COL_UP[c1] << 4) | (COL_UP[c2] << 8) | (COL_UP[c3] << 12),
+			SCORE_LEFT[c0] + SCORE_LEFT[c1] + SCORE_LEFT[c2] + SCORE_LEFT[c3]),
+		(COL_DOWN[c0] | (COL_DOWN[c1] << 4) | (COL_DOWN[c2] << 8) | (COL_DOWN[c3] << 12),
+			SCORE_RIGHT[c0] + SCORE_RIGHT[c1] + SCORE_RIGHT[c2] + SCORE_RIGHT[c3]),
+		(ROW_LEFT[r0] | (ROW_LEFT[r1] << 16) | (ROW_LEFT[r2] << 32) | (ROW_LEFT[r3] << 48),
+			SCORE_LEFT[r0] + SCORE_LEFT[r1] + SCORE_LEFT[r2] + SCORE_LEFT[r3]),
+		(ROW_RIGHT[r0] | (ROW_RIGHT[r1] << 16) | (ROW_RIGHT[r2] << 32) | (ROW_RIGHT[r3] << 48),
+			SCORE_RIGHT[r0] + SCORE_RIGHT[r1] + SCORE_RIGHT[r2] + SCORE_RIGHT[r3]),
+	]
+
+# Legal moves as a bitmask, one bit per action in 'UDLR' order
+ACTION_BITS = { 'U': 1, 'D': 2, 'L': 4, 'R': 8 }
+ACTION_INDEX = { 'U': 0, 'D': 1, 'L': 2, 'R': 3 }
+ACTION_STRINGS = [ ''.join(a for a in 'UDLR' if mask & ACTION_BITS[a]) for mask in range(16) ]
+
+def legalMoves(b):
+	t = transpose(b)
+	return ((ROW_CAN_MOVE[t & ROW_MASK] | ROW_CAN_MOVE[(t >> 16) & ROW_MASK]
+		| ROW_CAN_MOVE[(t >> 32) & ROW_MASK] | ROW_CAN_MOVE[t >> 48])
+		| (ROW_CAN_MOVE[b & ROW_MASK] | ROW_CAN_MOVE[(b >> 16) & ROW_MASK]
+		| ROW_CAN_MOVE[(b >> 32) & ROW_MASK] | ROW_CAN_MOVE[b >> 48]) << 2)
+
+NIBBLE_LOW_BITS = 0x1111111111111111
+
+def zeroNibbles(b):
+	# Bit 4*i set for every cell i that is 0
+	b |= b >> 1
+	b |= b >> 2
+	return ~b & NIBBLE_LOW_BITS
+
+def hasAdjacentPair(b):
+	# True if two neighbouring cells in a row or column hold the same value.
+	# Empty cells count too, so this is meant for full boards.
+	if zeroNibbles(b ^ (b >> 4)) & 0x0111011101110111:
+		return True
+	return zeroNibbles(b ^ (b >> 16)) & 0x0000111111111111 != 0
+
+def movesToWin(b, action):
+	# True if the move merges two 32768 tiles.  Only worth asking when the
+	# score gained by the move is at least 65536.
+	if action in 'UD':
+		b = transpose(b)
+	wins = WIN_LEFT if action in 'UL' else WIN_RIGHT
+	return any( ((b >> (16*r)) & ROW_MASK) in wins for r in range(4) )
+
+def maskCells(m):
+	# Cell indices of the bits set in a zeroNibbles() style mask
+	cells = []
+	while m:
+		low = m & -m
+		cells.append(low.bit_length() >> 2)
+		m ^= low
+	return cells
@@ -0,0 +1,86 @@
+from Game2048 import *
+from ListGame2048 import ListGame2048
+
+import argparse, sys
+
+# Checks the packed Game2048 against the list based reference engine: every
+# move, legal move list, game over test, spawn list and rotation on random
+# boards, then whole seeded games played on both engines side by side.
+
+def randomBoard(rng):
+	return [ rng.choice([0]*6 + list(range(1, 12))) for i in range(16) ]
+
+def checkState(packed, ref):
+	# Returns a description of the first difference, or None
+	if packed._board != ref._board or packed.getScore() != ref.getScore():
+		return 'board'
+	for a in 'UDLR':
+		m = packed.move(a)
+		r = ref.move(a)
+		if m._board != r._board or m.getScore() != r.getScore():
+			return f'move {a}'
+	if packed.actions() != ref.actions():
+		return 'actions'
+	if packed.gameOver() != ref.gameOver():
+		return 'gameOver'
+	if packed.possibleTiles() != ref.possibleTiles():
+		return 'possibleTiles'
+	for a in packed.actions():
+		if [ (g._board, p) for g, p in packed.possibleResults(a) ] != [ (g._board, p) for g, p in ref.possibleResults(a) ]:
+			return f'possibleResults {a}'
+	if [ (a, g._board, r) for a, g, r in packed.afterstates() ] != [ (a, g._board, r) for a, g, r in ref.afterstates() ]:
+		return 'afterstates'
+	if [ (i, t, p, g._board) for i, t, p, g in packed.chanceChildren() ] != [ (i, t, p, g._board) for i, t, p, g in ref.chanceChildren() ]:
+		return 'chanceChildren'
+	for k in range(4):
+		if packed.rotate(k)._board != ref.rotate(k)._board:
+			return f'rotate {k}'
+	if str(packed) != str(ref):
+		return 'str'
+	return None
+
+def checkBoards(count, seed):
+	rng = random.Random(seed)
+	for n in range(count):
+		b = randomBoard(rng)
+		problem = checkState(Game2048(list(b), 7), ListGame2048(list(b), 7))
+		if problem is not None:
+			print(f'Boards differ on {problem}: {b}')
+			return False
+	return True
+
+def checkGames(count, seed):
+	for n in range(count):
+		packed = Game2048()
+		ref = ListGame2048()
+		packed.setSeed(seed, n)
+		ref.setSeed(seed, n)
+		packed.randomize()
+		ref.randomize()
+		moves = random.Random(n)
+		while True:
+			problem = checkState(packed, ref)
+			if problem is not None:
+				print(f'Game {n} differs on {problem}:\n{ref}')
+				return False
+			if ref.gameOver():
+				break
+			a = moves.choice(ref.actions())
+			packed, reward = packed.result(a)
+			ref, refReward = ref.result(a)
+			if reward != refReward:
+				print(f'Game {n} differs on the reward of {a}')
+				return False
+	return True
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description ='Check Game2048 against ListGame2048')
+	parser.add_argument('-n', type=int, default=5000, help="number of random boards")
+	parser.add_argument('-g', type=int, default=20, help="number of seeded games")
+	parser.add_argument('-s', type=int, default=2048, help="random seed")
+	args = parser.parse_args()
+
+	if checkBoards(args.n, args.s) and checkGames(args.g, args.s):
+		print(f'Game2048 matches ListGame2048 on {args.n} boards and {args.g} games')
+	else:
+		sys.exit(1)
@@ -0,0 +1,122 @@
+import random
+import hashlib
+
+# Counter based random numbers: draw n of a stream is the SplitMix64 mix of
+# key + n*GAMMA, where the key comes from (seed, stream).  A stream has no
+# state besides its counter, so parallel workers can each take their own
+# stream id and get independent sequences that replay exactly, and any
+# draw can be reached directly with jump().
+#
+# It is a random.Random subclass, so choice(), randint() and the rest work
+# and it can be handed to Game2048 in place of the random module.  Draws
+# are made BLOCK at a time by bulk(), with NumPy when it is installed, and
+# handed out one by one; the values only depend on the counter, so the
+# blocks do not change the sequence.
+
+MASK64 = (1 << 64) - 1
+GAMMA = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+BLOCK = 512
+
+# NumPy for bulk(), imported on first use so that importing the engine does
+# not pay for it, False when it is not installed
+_np = None
+
+def _numpy():
+	global _np
+	if _np is None:
+		try:
+			import numpy
+			_np = numpy
+		except ImportError:
+			_np = False
+	return _np
+
+def _mix(z):
+	z = ((z ^ (z >> 30)) * MIX1) & MASK64
+	z = ((z ^ (z >> 27)) * MIX2) & MASK64
+	return z ^ (z >> 31)
+
+def stableSeed(a):
+	# 64-bit seed from any seed value.  hash() of a str differs from one
+	# process to the next, so it cannot be used for streams that replay.
+	return int.from_bytes(hashlib.sha256(repr(a).encode()).digest()[:8], 'little')
+
+class CounterRandom(random.Random):
+	def __init__(self, seed=0, stream=0):
+		self._stream = stream
+		random.Random.__init__(self, seed)
+
+	def seed(self, a=0, version=2):
+		if a is None:
+			a = random.getrandbits(64)
+		elif not isinstance(a, int):
+			a = stableSeed(a)
+		self._key = _mix(_mix(a & MASK64) ^ ((self._stream * GAMMA) & MASK64))
+		self.gauss_next = None
+		self.jump(0)
+
+	def getstate(self):
+		return (self._key, self._counter, self.gauss_next)
+
+	def setstate(self, state):
+		self._key, counter, self.gauss_next = state
+		self.jump(counter)
+
+	def jump(self, counter):
+		self._counter = counter
+		# Draws _base+1 onwards are in _block, and as floats in _floats
+		self._base = counter
+		self._block = []
+		self._floats = []
+
+	def _refill(self):
+		self._base = self._counter
+		self._block = self.bulk(BLOCK)
+		self._counter = self._base
+		self._floats = [ (z >> 11) * (1.0 / (1 << 53)) for z in self._block ]
+
+	def next64(self):
+		c = self._counter
+		self._counter = c + 1
+		try:
+			return self._block[c - self._base]
+		except IndexError:
+			self._counter = c
+			self._refill()
+			return self.next64()
+
+	def random(self):
+		c = self._counter
+		self._counter = c + 1
+		try:
+			return self._floats[c - self._base]
+		except IndexError:
+			self._counter = c
+			self._refill()
+			return self.random()
+
+	def getrandbits(self, k):
+		if k <= 64:
+			return self.next64() & ((1 << k) - 1)
+		bits = 0
+		n = 0
+		while n < k:
+			bits |= self.next64() << n
+			n += 64
+		return bits & ((1 << k) - 1)
+
+	def bulk(self, count):
+		# The next count raw 64-bit draws
+		key = self._key
+		start = self._counter
+		self._counter += count
+		np = _numpy() if count >= 64 else False
+		if np:
+			n = np.arange(start + 1, start + count + 1, dtype=np.uint64)
+			z = n * np.uint64(GAMMA) + np.uint64(key)
+			z = (z ^ (z >> np.uint64(30))) * np.uint64(MIX1)
+			z = (z ^ (z >> np.uint64(27))) * np.uint64(MIX2)
+			return (z ^ (z >> np.uint64(31))).tolist()
+		return [ _mix((key + (start + i) * GAMMA) & MASK64) for i in range(1, count + 1) ]
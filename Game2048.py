@@ -1,170 +1,467 @@
 import time
 import random
-import copy
+import os
+import functools
+
+import Bitboard
+from CounterRandom import CounterRandom
+
+WON_BIT = 1 << 64
+
+# Optional process wide LRU cache of Bitboard.allMoves, keyed by the packed
+# board and holding the afterstate and score of all four moves.  It is off
+# unless enableMoveCache() is called or GAME2048_MOVE_CACHE is set to the
+# number of boards to keep, so agents can try it without code changes.
+_cachedMoves = None
+
+def enableMoveCache(size=100000):
+	global _cachedMoves
+	_cachedMoves = functools.lru_cache(maxsize=size)(Bitboard.allMoves)
+
+def disableMoveCache():
+	global _cachedMoves
+	_cachedMoves = None
+
+def moveCacheInfo():
+	# hits, misses, maxsize and currsize, or None when the cache is off
+	if _cachedMoves is None:
+		return None
+	return _cachedMoves.cache_info()
+
+if os.environ.get('GAME2048_MOVE_CACHE'):
+	enableMoveCache(int(os.environ['GAME2048_MOVE_CACHE']))
+
+# Tile exponent and probability of each random tile
+TILE_PROBABILITIES = ((1, .75), (2, .25))
+
+class SpawnDistribution:
+	# The random tiles that can appear on a board, as (cell, tile,
+	# probability) triples.  Child boards are only built when asked for.
+	__slots__ = ('_state', '_cells', '_tiles')
+
+	def __init__(self, state, tiles=TILE_PROBABILITIES):
+		self._state = state
+		self._cells = state.emptyCells()
+		self._tiles = tiles
+
+	def __len__(self):
+		return len(self._cells) * len(self._tiles)
+
+	def __iter__(self):
+		n = len(self._cells)
+		for i in self._cells:
+			for t, p in self._tiles:
+				yield i, t, p/n
+
+	def cells(self):
+		# Grouped by cell: each empty cell with probability 1/n, the tile
+		# then follows the tile probabilities
+		return self._cells
+
+	def child(self, cell, tile):
+		return self._state.addTile(cell, tile)
+
+	def children(self):
+		# (child, probability) pairs, the same list possibleResults() gives
+		for i, t, p in self:
+			yield self.child(i, t), p
+
+class GameState(tuple):
+	# Immutable, hashable snapshot of a Game2048 as (packed board, score), for
+	# dict keys and visited sets.  Bit 64 of the board records a won game.
+	__slots__ = ()
+
+	def __new__(cls, b, s=0):
+		return tuple.__new__(cls, (b, s))
+
+	def getScore(self):
+		return self[1]
+
+	def getTile(self, r, c):
+		return (self[0] >> (16*r + 4*c)) & 0xF
+
+	def thaw(self):
+		g = Game2048(self[0] & ~WON_BIT, self[1])
+		g._won = self[0] >= WON_BIT
+		return g
+
+SHARED_ERROR = 'afterstates from move() are shared, change a copy() instead'
+
+_new = object.__new__
+
+def _newState(b, s, won):
+	# Game2048 from a packed board, setting the slots directly instead of
+	# going through the checks in __init__.  Used on the move path.
+	g = _new(Game2048)
+	g._b = b
+	g._score = s
+	g._won = won
+	g._empty = None
+	g._legal = None
+	g._over = None
+	g._after = None
+	g._rng = None
+	g._shared = False
+	return g
 
 class Game2048:
-	def __init__(self, b=None, s=None):
-		if b:
-			self._board = b
+	# The board is kept packed in a single int, see Bitboard.py for the layout.
+	__slots__ = ('_b', '_score', '_won', '_empty', '_legal', '_over', '_after', '_rng', '_shared')
+
+	def __init__(self, b=None, s=None, rng=None):
+		if not b:
+			# No board, an empty list or 0: the empty board
+			self._b = 0
+			self._won = False
+		elif type(b) is int:
+			self._b = b
+			self._won = False
 		else:
-			self._board = [0] * 16
+			self._b = Bitboard.pack(b)
+			self._won = Bitboard.WIN_TILE in b
 		
 		if s:
 			self._score = s
 		else:
 			self._score = 0
+
+		# Empty cell mask (see Bitboard.zeroNibbles), legal move bitmask,
+		# game over flag and afterstates, filled in on first use.  Children
+		# made by adding a tile get their empty mask from the parent.
+		self._empty = None
+		self._legal = None
+		self._over = None
+		self._after = None
+
+		# Source of the random tiles for randomize() and result(): the random
+		# module unless a random.Random like object is given.  States made by
+		# result() share it, so a seeded game replays exactly.
+		self._rng = rng
+
+		# Set on the afterstates move() and afterstates() keep and hand out
+		# again, which the in place API refuses to change
+		self._shared = False
+
+	def setRng(self, rng):
+		self._rng = rng
+
+	def setSeed(self, seed, stream=0):
+		# Own reproducible stream, independent of every other stream id
+		self._rng = CounterRandom(seed, stream)
+
+	@property
+	def _board(self):
+		return Bitboard.unpack(self._b)
 		
 	def randomize(self):
-		self._board = []
+		rng = self._rng or random
+		board = []
 		for i in range(16):
-			self._board.append(random.choice([0]*16 + [1]*4 + [2]*2 + [3]))
+			board.append(rng.choice([0]*16 + [1]*4 + [2]*2 + [3]))
+		self._b = Bitboard.pack(board)
+		self._won = False
+		self._empty = None
+		self._legal = None
+		self._over = None
+		self._after = None
+
+	def legalMask(self):
+		if self._legal is None:
+			self._legal = Bitboard.legalMoves(self._b)
+		return self._legal
 
 	def actions(self):
-		return ''.join([ a for a in 'UDLR' if self.move(a)._board != self._board ])
+		return Bitboard.ACTION_STRINGS[self.legalMask()]
 
 	def result(self, a):
 		s = self._score
+		rng = self._rng or random
 		g = self.move(a)
-		zeros = [ i for i in range(16) if g._board[i] == 0 ]
-		i = random.choice(zeros)
-		if random.randint(0,3) == 3:
-			g._board[i] = 2
+		zeros = g.emptyCells()
+		i = rng.choice(zeros)
+		if rng.randint(0,3) == 3:
+			g = g.addTile(i, 2)
 		else:
-			g._board[i] = 1
+			g = g.addTile(i, 1)
+		g._rng = self._rng
 		return g, g._score - s
 		
 	def getScore(self):
 		return self._score
 		
+	def getSize(self):
+		return 4
+
 	def getTile(self, r, c):
-		return self._board[4*r+c]
+		return (self._b >> (16*r + 4*c)) & 0xF
+
+	def emptyMask(self):
+		if self._empty is None:
+			self._empty = Bitboard.zeroNibbles(self._b)
+		return self._empty
+
+	def countEmpty(self):
+		return self.emptyMask().bit_count()
+
+	def emptyCells(self):
+		return Bitboard.maskCells(self.emptyMask())
 
 	def possibleResults(self, a):
-		s = self._score
-		possible = []
-		g = self.move(a)
-		zeros = [ i for i in range(16) if g._board[i] == 0 ]
-		for i in zeros:
-			g = self.move(a)
-			for t in [1,2]:
-				g._board[i] = t
-				if t == 1:
-					possible.append((g,.75/len(zeros)))
-				else:
-					possible.append((g,.25/len(zeros)))
-			
-		return possible
+		return list(self.move(a).spawnDistribution().children())
+
+	def spawnDistribution(self):
+		return SpawnDistribution(self)
 		
 	def possibleTiles(self):
 		possible = []
-		zeros = [ i for i in range(16) if self._board[i] == 0 ]
+		zeros = self.emptyCells()
 		for i in zeros:
 			for t in [1,2]:
 				possible.append((i,t))
 			
 		return possible
 		
+	def chanceChildren(self):
+		# (cell, tile, probability, child) in the order of possibleTiles(),
+		# with the probabilities of spawnDistribution() and the child state
+		# built straight from the packed board.
+		b = self._b
+		s = self._score
+		won = self._won
+		empty = self.emptyMask()
+		if not empty:
+			return
+		n = empty.bit_count()
+		tiles = [ (t, p/n) for t, p in TILE_PROBABILITIES ]
+		for i in Bitboard.maskCells(empty):
+			for t, p in tiles:
+				g = _newState(b | (t << (4*i)), s, won)
+				g._empty = empty ^ (1 << (4*i))
+				yield i, t, p, g
+
 	def addTile(self, t, v):
-		g = copy.deepcopy(self)
-		g._board[t] = v
+		g = _newState((self._b & ~(0xF << (4*t))) | (v << (4*t)), self._score, self._won)
+		if v:
+			g._empty = self.emptyMask() & ~(1 << (4*t))
 		return g
 
 	def move(self, action):
-		board = []
-		s = self._score
-		if action == 'R':
-			for i in range(0,16,4):
-				compressed = [t for t in self._board[i:i+4] if t != 0]
-				j = len(compressed) - 1
-				r = []
-				while j >= 0:
-					if j > 0 and compressed[j] == compressed[j-1]:
-						s += 2*(2**compressed[j])
-						r.insert(0,compressed[j]+1)
-						j -= 2
-					else:
-						r.insert(0,compressed[j])
-						j -= 1
-				r = [0] * (4-len(r)) + r					
-				board.extend(r)
-			return Game2048(board, s)
-		elif action == 'L':
-			for i in range(0,16,4):
-				compressed = [t for t in self._board[i:i+4] if t != 0]
-				j = 0
-				r = []
-				while j < len(compressed):
-					if j < len(compressed)-1 and compressed[j] == compressed[j+1]:
-						s += 2*(2**compressed[j])
-						r.append(compressed[j]+1)
-						j += 2
-					else:
-						r.append(compressed[j])
-						j += 1
-				r = r + [0] * (4-len(r))					
-				board.extend(r)
-			return Game2048(board, s)
-		elif action == 'D':
-			return self._flip().move('R')._flip()
-		elif action == 'U':
-			f = self._flip()
-			return self._flip().move('L')._flip()
+		# Builds a new state for every move, which keeps it at about 4-5x
+		# the list engine; searches that need more walk one board with the
+		# in place API below, or use the Bitboard move functions directly.
+		# Afterstates are kept on the state, so asking again for the same
+		# move (for example at the root of every deepening pass) is free.
+		# The returned state is shared: the in place API refuses it, copy()
+		# gives a state that can be changed.
+		if self._after is None:
+			self._after = {}
 		else:
+			g = self._after.get(action)
+			if g is not None:
+				return g
+
+		f = Bitboard.MOVES.get(action)
+		if f is None:
 			print('ERROR move =', action)
+			return None
+		if _cachedMoves is None:
+			b, gained = f(self._b)
+		else:
+			b, gained = _cachedMoves(self._b)[Bitboard.ACTION_INDEX[action]]
+		g = _newState(b, self._score + gained,
+			self._won or (gained >= 65536 and Bitboard.movesToWin(self._b, action)))
+		g._shared = True
+		self._after[action] = g
+		return g
 				
+	def afterstates(self):
+		# (action, afterstate, reward) for every legal move, in 'UDLR' order,
+		# from one pass over the row tables.  The afterstates are the same
+		# shared objects move() returns.  The full list is kept in the
+		# afterstate cache under the key None.
+		if self._after is None:
+			self._after = {}
+		else:
+			found = self._after.get(None)
+			if found is not None:
+				return found
+
+		b = self._b
+		s = self._score
+		found = []
+		legal = 0
+		moves = Bitboard.allMoves(b) if _cachedMoves is None else _cachedMoves(b)
+		for a, (m, gained) in zip('UDLR', moves):
+			if m == b:
+				continue
+			legal |= Bitboard.ACTION_BITS[a]
+			g = self._after.get(a)
+			if g is None:
+				g = _newState(m, s + gained, self._won or (gained >= 65536 and Bitboard.movesToWin(b, a)))
+				g._shared = True
+				self._after[a] = g
+			found.append((a, g, gained))
+
+		self._legal = legal
+		self._after[None] = found
+		return found
+
+	# In place API for depth first searchers that walk the tree on a single
+	# board: applyMove() returns a token that undo() uses to restore the
+	# state, and placeTile()/removeTile() set and clear a spawned tile.
+	# Afterstates from move() and afterstates() are shared with the state
+	# that made them, so these raise ValueError on them; search on a copy().
+	def applyMove(self, action):
+		if self._shared:
+			raise ValueError(SHARED_ERROR)
+		token = (self._b, self._score, self._won, self._empty, self._legal, self._over, self._after)
+		if _cachedMoves is None:
+			b, gained = Bitboard.MOVES[action](self._b)
+		else:
+			b, gained = _cachedMoves(self._b)[Bitboard.ACTION_INDEX[action]]
+		if gained >= 65536 and Bitboard.movesToWin(self._b, action):
+			self._won = True
+		self._b = b
+		self._score += gained
+		self._empty = None
+		self._legal = None
+		self._over = None
+		self._after = None
+		return token
+
+	def undo(self, token):
+		self._b, self._score, self._won, self._empty, self._legal, self._over, self._after = token
+
+	def placeTile(self, t, v):
+		if self._shared:
+			raise ValueError(SHARED_ERROR)
+		self._b = (self._b & ~(0xF << (4*t))) | (v << (4*t))
+		if self._empty is not None and v:
+			self._empty &= ~(1 << (4*t))
+		else:
+			self._empty = None
+		self._legal = None
+		self._over = None
+		self._after = None
+
+	def removeTile(self, t):
+		if self._shared:
+			raise ValueError(SHARED_ERROR)
+		self._b &= ~(0xF << (4*t))
+		if self._empty is not None:
+			self._empty |= 1 << (4*t)
+		self._legal = None
+		self._over = None
+		self._after = None
+
+	def freeze(self):
+		if self._won:
+			return GameState(self._b | WON_BIT, self._score)
+		return GameState(self._b, self._score)
+
+	def toBytes(self):
+		# 8 byte little endian packed board, then the score as a varint with
+		# the won flag in its lowest bit
+		data = bytearray(self._b.to_bytes(8, 'little'))
+		v = (self._score << 1) | self._won
+		while v >= 0x80:
+			data.append((v & 0x7F) | 0x80)
+			v >>= 7
+		data.append(v)
+		return bytes(data)
+
+	@staticmethod
+	def fromBytes(data):
+		v = 0
+		shift = 0
+		for byte in data[8:]:
+			v |= (byte & 0x7F) << shift
+			shift += 7
+			if byte < 0x80:
+				break
+		g = Game2048(int.from_bytes(data[:8], 'little'), v >> 1)
+		g._won = bool(v & 1)
+		return g
+
+	def copy(self):
+		return _newState(self._b, self._score, self._won)
+
 	def _flip(self):
-		r = []
-		for i in range(4):
-			r.extend( self._board[i:16:4] )
-		return Game2048(r, self._score)
+		g = Game2048(Bitboard.transpose(self._b), self._score)
+		g._won = self._won
+		return g
 		
 	def rotate(self, numRotations):
-		numRotations = numRotations % 4
-		if numRotations == 0:
-			return Game2048(copy.copy(self._board), self._score)
-			
-		if numRotations == 1:
-			b = [0]*16
-			for r in range(4):
-				for c in range(4):
-					b[4*c + 3-r] = self._board[4*r+c]
-			return Game2048(b, self._score)
-			
-		if numRotations == 2:
-			b = [0]*16
-			for r in range(4):
-				for c in range(4):
-					b[4*(3-r) + 3-c] = self._board[4*r+c]
-			return Game2048(b, self._score)
-			
-		if numRotations == 3:
-			b = [0]*16
-			for r in range(4):
-				for c in range(4):
-					b[4*(3-c) + r] = self._board[4*r+c]
-			return Game2048(b, self._score)
+		g = Game2048(Bitboard.rotate(self._b, numRotations), self._score)
+		g._won = self._won
+		return g
+
+	def getRow(self, r):
+		# Row r as a tuple of 4 exponents
+		return Bitboard.ROW_TUPLES[(self._b >> (16*r)) & Bitboard.ROW_MASK]
 			
+	def symmetries(self):
+		# All 8 rotations and reflections of the board, this one first
+		games = []
+		for b in Bitboard.symmetries(self._b):
+			g = Game2048(b, self._score)
+			g._won = self._won
+			games.append(g)
+		return games
+
+	def canonicalKey(self):
+		# Packed board shared by every symmetric version of this board, for
+		# transposition and value tables
+		return Bitboard.canonical(self._b)
+
 	def gameOver(self):
-		return self.actions() == '' or 16 in self._board
+		# A tile can move whenever there is an empty cell or two equal
+		# neighbours, so the full move generation is never needed here.  The
+		# empty board is the one board with empty cells and no move.
+		if self._over is None:
+			b = self._b
+			self._over = self._won or b == 0 or not (self.emptyMask() or Bitboard.hasAdjacentPair(b))
+		return self._over
 
 	def __str__(self):
 		s = ''
+		board = self._board
 		for r in range(0,16,4):
-			s += ' '.join(f'{2**x} '.rjust(5) for x in self._board[r:r+4]).replace(' 1 ','   ') + '\n'
+			s += ' '.join(f'{2**x} '.rjust(5) for x in board[r:r+4]).replace(' 1 ','   ') + '\n'
 		s += f'Score = {self._score}'
 		return s
 		
+class SearchTimeout(Exception):
+	# Raised by BasePlayer.checkTime() to abandon a search out of time
+	pass
+
 class BasePlayer:
 	def __init__(self, timeLimit):
 		self._timeLimit = timeLimit
 		self._startTime = 0
 		self._move = None
 
+		# Searchers count nodes in _nodeCount and call checkTime() once it
+		# reaches _nextCheck, so the clock is read every _checkInterval
+		# nodes instead of at every node
+		self._nodeCount = 0
+		self._nextCheck = 0
+		self._checkInterval = 256
+
 	def timeRemaining(self):
 		if time.time() < self._startTime + self._timeLimit:
 			return True
 		return False
 
+	def startClock(self):
+		# Check the time at the next node of a new search
+		self._nextCheck = self._nodeCount
+
+	def checkTime(self):
+		if time.time() >= self._startTime + self._timeLimit:
+			raise SearchTimeout()
+		self._nextCheck = self._nodeCount + self._checkInterval
+
 	def setMove(self, move):
 		if self.timeRemaining():
 			self._move = move
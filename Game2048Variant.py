@@ -0,0 +1,403 @@
+import random
+
+from Game2048 import TILE_PROBABILITIES, SHARED_ERROR, SpawnDistribution
+from CounterRandom import CounterRandom
+import Bitboard
+
+# 2048 on an n x n board with configurable spawn odds and winning tile.
+#
+# The board is packed like Game2048's: the exponent of cell i = n*r + c is
+# the nibble at bit 4*i, so row r is the 4n-bit word at bit 4*n*r.  A 4x4
+# board moves with the Bitboard.py tables.  A 5x5 or 6x6 row does not fit
+# a table of every row, so each size has tables keyed by the packed row
+# that fill in as new rows are seen and are emptied when they reach
+# TABLE_ROWS entries, which keeps them under 30 MB per board size.  A
+# search quickly settles on a working set of rows, after which each move
+# is n lookups (2n for up and down) like the 4x4 engine.
+#
+# Tiles above 2**15 do not fit a nibble; like Game2048 they saturate at 15,
+# which is why a winning tile can be at most 2**16.
+
+TABLE_ROWS = 1 << 14
+
+def _slideLeft(cells):
+	# (slid cells, score, largest tile made by a merge)
+	compressed = [t for t in cells if t != 0]
+	j = 0
+	r = []
+	score = 0
+	made = 0
+	while j < len(compressed):
+		if j < len(compressed)-1 and compressed[j] == compressed[j+1]:
+			score += 2*(2**compressed[j])
+			made = max(made, compressed[j]+1)
+			r.append(min(compressed[j]+1, Bitboard.MAX_NIBBLE))
+			j += 2
+		else:
+			r.append(compressed[j])
+			j += 1
+	return r + [0] * (len(cells)-len(r)), score, made
+
+def _slideRow(row, shifts, places):
+	# Slides the nibbles of row at shifts, in that order, towards the first
+	# one and puts the k-th result tile at bit places[k].  Returns (slid
+	# tiles, score).
+	out = 0
+	score = 0
+	k = 0
+	held = 0
+	for s in shifts:
+		t = (row >> s) & 0xF
+		if t == 0:
+			continue
+		if t == held:
+			score += 2 << t
+			out |= min(t+1, Bitboard.MAX_NIBBLE) << places[k]
+			k += 1
+			held = 0
+		else:
+			if held:
+				out |= held << places[k]
+				k += 1
+			held = t
+	if held:
+		out |= held << places[k]
+	return out, score
+
+class RowTable(dict):
+	# Row results for one board size, looked up as table[row] and computed
+	# by compute(row) the first time a row is seen
+	def __init__(self, compute):
+		self._compute = compute
+
+	def __missing__(self, row):
+		found = self._compute(row)
+		if len(self) >= TABLE_ROWS:
+			self.clear()
+		self[row] = found
+		return found
+
+class RowTables:
+	# The tables of one board size.  left/right give (moved row, score),
+	# up/down give the moved row spread out into a column (nibble c at bit
+	# 4*n*c) and the score, and spread gives the unmoved row spread out the
+	# same way, for transposing.
+	def __init__(self, size):
+		shifts = [ 4*c for c in range(size) ]
+		down = shifts[::-1]
+		column = [ 4*size*c for c in range(size) ]
+		self.left = RowTable(lambda row: _slideRow(row, shifts, shifts))
+		self.right = RowTable(lambda row: _slideRow(row, down, down))
+		self.up = RowTable(lambda row: _slideRow(row, shifts, column))
+		self.down = RowTable(lambda row: _slideRow(row, down, column[::-1]))
+		self.spread = RowTable(lambda row: sum(((row >> s) & 0xF) << p for s, p in zip(shifts, column)))
+
+_TABLES = {}
+
+def rowTables(size):
+	# The shared tables for one board size
+	tables = _TABLES.get(size)
+	if tables is None:
+		tables = _TABLES[size] = RowTables(size)
+	return tables
+
+class Rules:
+	# Everything that is shared by all states of one kind of game
+	def __init__(self, size=4, tiles=TILE_PROBABILITIES, winTile=Bitboard.WIN_TILE):
+		if winTile > Bitboard.WIN_TILE:
+			raise ValueError(f'Winning tile must be at most 2**{Bitboard.WIN_TILE}')
+		self.size = size
+		self.cells = size*size
+		self.tiles = tuple(tiles)
+		self.winTile = winTile
+
+		self.rowBits = 4*size
+		self.rowMask = (1 << self.rowBits) - 1
+		self.lowBits = sum(1 << (4*i) for i in range(self.cells))
+		# Low bit of every cell that has a right neighbour, and of every
+		# cell that has one below
+		self.rowPairBits = sum(1 << (4*i) for i in range(self.cells) if i % size != size-1)
+		self.colPairBits = sum(1 << (4*i) for i in range(self.cells - size))
+		self.tables = rowTables(size) if size != 4 else None
+		self.rowShifts = tuple(range(0, self.rowBits*size, self.rowBits))
+		self.colShifts = tuple(range(0, 4*size, 4))
+
+	def drawTile(self, rng):
+		u = rng.random()
+		for t, p in self.tiles:
+			u -= p
+			if u < 0:
+				return t
+		return self.tiles[-1][0]
+
+	def zeroNibbles(self, b):
+		b |= b >> 1
+		b |= b >> 2
+		return ~b & self.lowBits
+
+	def slide(self, b, action):
+		# (board, score gained), or None for an unknown action
+		tables = self.tables
+		if tables is None:
+			f = Bitboard.MOVES.get(action)
+			return f(b) if f is not None else None
+
+		mask = self.rowMask
+		out = 0
+		score = 0
+		if action == 'L' or action == 'R':
+			table = tables.left if action == 'L' else tables.right
+			for s in self.rowShifts:
+				moved, gained = table[(b >> s) & mask]
+				out |= moved << s
+				score += gained
+		elif action == 'U' or action == 'D':
+			table = tables.up if action == 'U' else tables.down
+			spread = tables.spread
+			t = 0
+			for s, c in zip(self.rowShifts, self.colShifts):
+				t |= spread[(b >> s) & mask] << c
+			for s, c in zip(self.rowShifts, self.colShifts):
+				moved, gained = table[(t >> s) & mask]
+				out |= moved << c
+				score += gained
+		else:
+			return None
+		return out, score
+
+	def makesWinTile(self, b, action):
+		# True if the move merges two tiles into the winning tile.  Only
+		# worth asking when the score gained is at least 2**winTile.
+		n = self.size
+		cells = [ (b >> (4*i)) & 0xF for i in range(self.cells) ]
+		if action == 'U' or action == 'D':
+			lines = [ cells[c::n] for c in range(n) ]
+		else:
+			lines = [ cells[i:i+n] for i in range(0, self.cells, n) ]
+		if action == 'R' or action == 'D':
+			lines = [ line[::-1] for line in lines ]
+		return any( _slideLeft(line)[2] >= self.winTile for line in lines )
+
+class Game2048Variant:
+	# Same interface as Game2048, so the agents and Play.py run on it
+	__slots__ = ('_rules', '_b', '_score', '_won', '_empty', '_after', '_rng', '_shared')
+
+	def __init__(self, rules=None, b=None, s=0, rng=None):
+		if rules is None:
+			rules = Rules()
+		self._rules = rules
+		if b is None:
+			self._b = 0
+			self._won = False
+		elif type(b) is int:
+			self._b = b
+			self._won = False
+		else:
+			self._b = sum(min(t, Bitboard.MAX_NIBBLE) << (4*i) for i, t in enumerate(b))
+			self._won = any(t >= rules.winTile for t in b)
+		self._score = s
+		self._empty = None
+		self._after = None
+		self._rng = rng
+		self._shared = False
+
+	def _make(self, b, score, won):
+		# New state on the same rules, without the checks in __init__
+		g = Game2048Variant.__new__(Game2048Variant)
+		g._rules = self._rules
+		g._b = b
+		g._score = score
+		g._won = won
+		g._empty = None
+		g._after = None
+		g._rng = self._rng
+		g._shared = False
+		return g
+
+	def setRng(self, rng):
+		self._rng = rng
+
+	def setSeed(self, seed, stream=0):
+		self._rng = CounterRandom(seed, stream)
+
+	@property
+	def _board(self):
+		return tuple( (self._b >> (4*i)) & 0xF for i in range(self._rules.cells) )
+
+	def randomize(self):
+		rng = self._rng or random
+		board = [ rng.choice([0]*16 + [1]*4 + [2]*2 + [3]) for i in range(self._rules.cells) ]
+		self._b = sum(t << (4*i) for i, t in enumerate(board))
+		self._won = any(t >= self._rules.winTile for t in board)
+		self._empty = None
+		self._after = None
+
+	def actions(self):
+		return ''.join([ a for a, g, reward in self.afterstates() ])
+
+	def result(self, a):
+		rng = self._rng or random
+		g = self.move(a)
+		i = rng.choice(g.emptyCells())
+		g = g.addTile(i, self._rules.drawTile(rng))
+		return g, g._score - self._score
+
+	def getScore(self):
+		return self._score
+
+	def getSize(self):
+		return self._rules.size
+
+	def getTile(self, r, c):
+		return (self._b >> (4*(self._rules.size*r + c))) & 0xF
+
+	def emptyMask(self):
+		if self._empty is None:
+			self._empty = self._rules.zeroNibbles(self._b)
+		return self._empty
+
+	def countEmpty(self):
+		return self.emptyMask().bit_count()
+
+	def emptyCells(self):
+		return Bitboard.maskCells(self.emptyMask())
+
+	def possibleResults(self, a):
+		return list(self.move(a).spawnDistribution().children())
+
+	def spawnDistribution(self):
+		return SpawnDistribution(self, self._rules.tiles)
+
+	def possibleTiles(self):
+		return [ (i, t) for i in self.emptyCells() for t, p in self._rules.tiles ]
+
+	def chanceChildren(self):
+		# (cell, tile, probability, child) with this game's spawn odds
+		b = self._b
+		empty = self.emptyMask()
+		if not empty:
+			return
+		n = empty.bit_count()
+		tiles = [ (t, p/n) for t, p in self._rules.tiles ]
+		for i in Bitboard.maskCells(empty):
+			for t, p in tiles:
+				g = self._make(b | (t << (4*i)), self._score, self._won)
+				g._empty = empty ^ (1 << (4*i))
+				yield i, t, p, g
+
+	def addTile(self, t, v):
+		g = self._make((self._b & ~(0xF << (4*t))) | (v << (4*t)), self._score, self._won)
+		if v:
+			g._empty = self.emptyMask() & ~(1 << (4*t))
+		return g
+
+	def _afterstate(self, action):
+		found = self._rules.slide(self._b, action)
+		if found is None:
+			return None
+		b, gained = found
+		won = self._won or (gained >> self._rules.winTile != 0 and self._rules.makesWinTile(self._b, action))
+		g = self._make(b, self._score + gained, won)
+		# Kept in _after and handed out again, like Game2048's afterstates
+		g._shared = True
+		return g, gained
+
+	def move(self, action):
+		if self._after is None:
+			self._after = {}
+		else:
+			g = self._after.get(action)
+			if g is not None:
+				return g
+
+		found = self._afterstate(action)
+		if found is None:
+			print('ERROR move =', action)
+			return None
+		self._after[action] = found[0]
+		return found[0]
+
+	def afterstates(self):
+		# (action, afterstate, reward) for every legal move, as in Game2048
+		if self._after is None:
+			self._after = {}
+		else:
+			found = self._after.get(None)
+			if found is not None:
+				return found
+
+		found = []
+		for a in 'UDLR':
+			g = self._after.get(a)
+			if g is None:
+				g, gained = self._afterstate(a)
+				self._after[a] = g
+			if g._b != self._b:
+				found.append((a, g, g._score - self._score))
+		self._after[None] = found
+		return found
+
+	# The in place API refuses shared afterstates, as in Game2048
+	def applyMove(self, action):
+		if self._shared:
+			raise ValueError(SHARED_ERROR)
+		token = (self._b, self._score, self._won, self._empty, self._after)
+		g = self._afterstate(action)[0]
+		self._b = g._b
+		self._score = g._score
+		self._won = g._won
+		self._empty = None
+		self._after = None
+		return token
+
+	def undo(self, token):
+		self._b, self._score, self._won, self._empty, self._after = token
+
+	def placeTile(self, t, v):
+		if self._shared:
+			raise ValueError(SHARED_ERROR)
+		self._b = (self._b & ~(0xF << (4*t))) | (v << (4*t))
+		self._empty = None
+		self._after = None
+
+	def removeTile(self, t):
+		if self._shared:
+			raise ValueError(SHARED_ERROR)
+		self._b &= ~(0xF << (4*t))
+		self._empty = None
+		self._after = None
+
+	def copy(self):
+		return self._make(self._b, self._score, self._won)
+
+	def rotate(self, numRotations):
+		# Quarter turns clockwise
+		n = self._rules.size
+		board = self._board
+		for k in range(numRotations % 4):
+			board = [ board[n*(n-1-c) + r] for r in range(n) for c in range(n) ]
+		return Game2048Variant(self._rules, board, self._score, self._rng)
+
+	def getRow(self, r):
+		return self._board[self._rules.size*r:self._rules.size*(r+1)]
+
+	def gameOver(self):
+		if self._won:
+			return True
+		b = self._b
+		rules = self._rules
+		if self.emptyMask():
+			return b == 0
+		# Full board: over unless two neighbours are equal
+		n = rules.size
+		return not (rules.zeroNibbles(b ^ (b >> 4)) & rules.rowPairBits
+			or rules.zeroNibbles(b ^ (b >> (4*n))) & rules.colPairBits)
+
+	def __str__(self):
+		n = self._rules.size
+		board = self._board
+		s = ''
+		for r in range(0, n*n, n):
+			s += ' '.join(f'{2**x} '.rjust(6) for x in board[r:r+n]).replace(' 1 ','   ') + '\n'
+		s += f'Score = {self._score}'
+		return s
@@ -9,9 +9,8 @@ class Player(BasePlayer):
 		bestScore = -1000
 		bestMove = ''
 		
-		for a in board.actions():
+		for a, m, reward in board.afterstates():
 			print('Testing', a)
-			m = board.move(a)
 			if m.getScore() > bestScore:
 				bestScore = m.getScore()
 				bestMove = a
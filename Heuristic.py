@@ -0,0 +1,107 @@
+import functools
+
+import Bitboard
+
+# Row tables for the MyAgent heuristic.  Every feature except the corner
+# bonus adds up over the rows and columns of the board, so each 16-bit row
+# gets its features packed into one int and a board needs 4 row lookups
+# plus 4 column lookups (rows of the transposed board).  The fields are
+# wide enough that summing the rows and columns of boards up to 6x6 never
+# carries.  Other board sizes compute the features of a row when it is
+# first seen.
+#
+#   bits  0-7   equal adjacent non-empty pairs (merge potential)
+#   bits  8-19  sum of |a-b| over adjacent non-empty tiles (minus smoothness)
+#   bits 20-31  monotonicity towards the end of the row
+#   bits 32-43  monotonicity towards the start of the row
+#   bits 44-51  empty cells
+
+_MERGES = 0
+_ROUGH = 8
+_INC = 20
+_DEC = 32
+_EMPTY = 44
+
+def _rowFeatures(cells):
+	merges = 0
+	rough = 0
+	for c in range(len(cells)-1):
+		if cells[c] and cells[c+1]:
+			rough += abs(cells[c] - cells[c+1])
+		if cells[c] == cells[c+1] and cells[c] != 0:
+			merges += 1
+
+	inc = 0
+	dec = 0
+	prev = 0
+	for val in cells:
+		if val:
+			if prev and val > prev:
+				inc += val - prev
+			elif prev:
+				dec += prev - val
+			prev = val
+
+	empty = cells.count(0)
+	return (merges << _MERGES) | (rough << _ROUGH) | (inc << _INC) | (dec << _DEC) | (empty << _EMPTY)
+
+ROW_FEATURES = [0] * 65536
+ROW_MAX = [0] * 65536
+
+def _buildTables():
+	for row in range(65536):
+		cells = [ (row >> (4*c)) & 0xF for c in range(4) ]
+		ROW_FEATURES[row] = _rowFeatures(cells)
+		ROW_MAX[row] = max(cells)
+
+_buildTables()
+
+def evaluateBoard(b, score):
+	# Same value as MyAgent.Player.slowHeuristic
+	mask = Bitboard.ROW_MASK
+	r0 = b & mask
+	r1 = (b >> 16) & mask
+	r2 = (b >> 32) & mask
+	r3 = b >> 48
+	rows = ROW_FEATURES[r0] + ROW_FEATURES[r1] + ROW_FEATURES[r2] + ROW_FEATURES[r3]
+	t = Bitboard.transpose(b)
+	cols = (ROW_FEATURES[t & mask] + ROW_FEATURES[(t >> 16) & mask]
+		+ ROW_FEATURES[(t >> 32) & mask] + ROW_FEATURES[t >> 48])
+
+	maxTile = max(ROW_MAX[r0], ROW_MAX[r1], ROW_MAX[r2], ROW_MAX[r3])
+	if maxTile in (b & 0xF, (b >> 12) & 0xF, (b >> 48) & 0xF, b >> 60):
+		cornerBonus = maxTile * 2
+	else:
+		cornerBonus = 0
+
+	return _value(rows, cols, score, cornerBonus)
+
+def _value(rows, cols, score, cornerBonus):
+	both = rows + cols
+	empty = (rows >> _EMPTY) & 0xFF
+	smoothness = -((both >> _ROUGH) & 0xFFF)
+	mergePotential = (both >> _MERGES) & 0xFF
+	monotonicity = (max((rows >> _INC) & 0xFFF, (rows >> _DEC) & 0xFFF)
+		+ max((cols >> _INC) & 0xFFF, (cols >> _DEC) & 0xFFF))
+
+	return score + empty * 200 + monotonicity * 2.0 + smoothness * 0.1 + cornerBonus + mergePotential * 50
+
+@functools.lru_cache(maxsize=1 << 16)
+def _lineFeatures(cells):
+	return _rowFeatures(cells)
+
+def evaluateCells(cells, n, score):
+	# The same heuristic for an n x n board given as a row major sequence
+	rows = sum(_lineFeatures(tuple(cells[i:i+n])) for i in range(0, n*n, n))
+	cols = sum(_lineFeatures(tuple(cells[c::n])) for c in range(n))
+	maxTile = max(cells)
+	if maxTile in (cells[0], cells[n-1], cells[-n], cells[-1]):
+		cornerBonus = maxTile * 2
+	else:
+		cornerBonus = 0
+	return _value(rows, cols, score, cornerBonus)
+
+def evaluate(state):
+	if state.getSize() == 4:
+		return evaluateBoard(state._b, state._score)
+	return evaluateCells(state._board, state.getSize(), state._score)
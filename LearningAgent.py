@@ -35,7 +35,7 @@ class Player(BasePlayer):
 		v = 0.
 		for turns in range(4):
 			g = board.rotate(turns)
-			v += self._valueTable[ tuple( g._board[:4] ) ]
+			v += self._valueTable[ g.getRow(0) ]
 			
 		return v
 
@@ -43,10 +43,10 @@ class Player(BasePlayer):
 		bestValue = float('-inf')
 		bestMove = ''
 		
-		for a in board.actions():
+		for a, after, reward in board.afterstates():
 			# Finding the expected (or average) value of the state after the move is taken
 			v = 0
-			for (g, p) in board.possibleResults(a):
+			for (g, p) in after.spawnDistribution().children():
 				v += p * self.value(g)
 				
 			if v > bestValue:
@@ -73,7 +73,7 @@ class Player(BasePlayer):
 				update = self._learningRate * (reward + self._discountFactor*self.value(state) - self.value(oldState))
 				for turns in range(4):
 					rotated = oldState.rotate(turns)
-					self._valueTable[tuple(rotated._board[:4])] += update
+					self._valueTable[rotated.getRow(0)] += update
 					
 					
 		
@@ -0,0 +1,224 @@
+import random
+import copy
+
+from Game2048 import SpawnDistribution
+from CounterRandom import CounterRandom
+import Bitboard
+
+# The original list based Game2048, kept as a reference engine.  Its moves,
+# merges and spawns are the original code, with the interface the agents
+# use added on top, so Play.py -l and any agent can run on it.
+# CheckEngine.py plays the packed Game2048 against it move by move, and
+# Benchmark.py measures the packed engine against it.
+
+class ListGame2048:
+	def __init__(self, b=None, s=None, rng=None):
+		if b:
+			self._board = b
+		else:
+			self._board = [0] * 16
+
+		if s:
+			self._score = s
+		else:
+			self._score = 0
+
+		self._rng = rng
+
+	def setRng(self, rng):
+		self._rng = rng
+
+	def setSeed(self, seed, stream=0):
+		self._rng = CounterRandom(seed, stream)
+
+	@property
+	def _b(self):
+		# Packed board, for transposition table keys and the heuristic
+		return Bitboard.pack([ min(t, Bitboard.MAX_NIBBLE) for t in self._board ])
+
+	def randomize(self):
+		rng = self._rng or random
+		self._board = []
+		for i in range(16):
+			self._board.append(rng.choice([0]*16 + [1]*4 + [2]*2 + [3]))
+
+	def actions(self):
+		return ''.join([ a for a in 'UDLR' if self.move(a)._board != self._board ])
+
+	def result(self, a):
+		s = self._score
+		rng = self._rng or random
+		g = self.move(a)
+		zeros = [ i for i in range(16) if g._board[i] == 0 ]
+		i = rng.choice(zeros)
+		if rng.randint(0,3) == 3:
+			g._board[i] = 2
+		else:
+			g._board[i] = 1
+		g._rng = self._rng
+		return g, g._score - s
+
+	def getScore(self):
+		return self._score
+
+	def getSize(self):
+		return 4
+
+	def getTile(self, r, c):
+		return self._board[4*r+c]
+
+	def emptyCells(self):
+		return [ i for i in range(16) if self._board[i] == 0 ]
+
+	def countEmpty(self):
+		return self._board.count(0)
+
+	def possibleResults(self, a):
+		possible = []
+		g = self.move(a)
+		zeros = [ i for i in range(16) if g._board[i] == 0 ]
+		for i in zeros:
+			for t in [1,2]:
+				if t == 1:
+					possible.append((g.addTile(i, t),.75/len(zeros)))
+				else:
+					possible.append((g.addTile(i, t),.25/len(zeros)))
+
+		return possible
+
+	def spawnDistribution(self):
+		return SpawnDistribution(self)
+
+	def possibleTiles(self):
+		possible = []
+		zeros = [ i for i in range(16) if self._board[i] == 0 ]
+		for i in zeros:
+			for t in [1,2]:
+				possible.append((i,t))
+
+		return possible
+
+	def chanceChildren(self):
+		for i, t, p in self.spawnDistribution():
+			yield i, t, p, self.addTile(i, t)
+
+	def addTile(self, t, v):
+		g = copy.deepcopy(self)
+		g._board[t] = v
+		return g
+
+	def move(self, action):
+		board = []
+		s = self._score
+		if action == 'R':
+			for i in range(0,16,4):
+				compressed = [t for t in self._board[i:i+4] if t != 0]
+				j = len(compressed) - 1
+				r = []
+				while j >= 0:
+					if j > 0 and compressed[j] == compressed[j-1]:
+						s += 2*(2**compressed[j])
+						r.insert(0,compressed[j]+1)
+						j -= 2
+					else:
+						r.insert(0,compressed[j])
+						j -= 1
+				r = [0] * (4-len(r)) + r
+				board.extend(r)
+			return ListGame2048(board, s)
+		elif action == 'L':
+			for i in range(0,16,4):
+				compressed = [t for t in self._board[i:i+4] if t != 0]
+				j = 0
+				r = []
+				while j < len(compressed):
+					if j < len(compressed)-1 and compressed[j] == compressed[j+1]:
+						s += 2*(2**compressed[j])
+						r.append(compressed[j]+1)
+						j += 2
+					else:
+						r.append(compressed[j])
+						j += 1
+				r = r + [0] * (4-len(r))
+				board.extend(r)
+			return ListGame2048(board, s)
+		elif action == 'D':
+			return self._flip().move('R')._flip()
+		elif action == 'U':
+			return self._flip().move('L')._flip()
+		else:
+			print('ERROR move =', action)
+
+	def afterstates(self):
+		found = []
+		for a in 'UDLR':
+			g = self.move(a)
+			if g._board != self._board:
+				found.append((a, g, g._score - self._score))
+		return found
+
+	def applyMove(self, action):
+		token = (self._board, self._score)
+		g = self.move(action)
+		self._board = g._board
+		self._score = g._score
+		return token
+
+	def undo(self, token):
+		self._board, self._score = token
+
+	def placeTile(self, t, v):
+		self._board = list(self._board)
+		self._board[t] = v
+
+	def removeTile(self, t):
+		self._board = list(self._board)
+		self._board[t] = 0
+
+	def copy(self):
+		return ListGame2048(list(self._board), self._score)
+
+	def _flip(self):
+		r = []
+		for i in range(4):
+			r.extend( self._board[i:16:4] )
+		return ListGame2048(r, self._score)
+
+	def rotate(self, numRotations):
+		numRotations = numRotations % 4
+		if numRotations == 0:
+			return ListGame2048(copy.copy(self._board), self._score)
+
+		if numRotations == 1:
+			b = [0]*16
+			for r in range(4):
+				for c in range(4):
+					b[4*c + 3-r] = self._board[4*r+c]
+			return ListGame2048(b, self._score)
+
+		if numRotations == 2:
+			b = [0]*16
+			for r in range(4):
+				for c in range(4):
+					b[4*(3-r) + 3-c] = self._board[4*r+c]
+			return ListGame2048(b, self._score)
+
+		if numRotations == 3:
+			b = [0]*16
+			for r in range(4):
+				for c in range(4):
+					b[4*(3-c) + r] = self._board[4*r+c]
+			return ListGame2048(b, self._score)
+
+	def getRow(self, r):
+		return tuple(self._board[4*r:4*r+4])
+
+	def gameOver(self):
+		return self.actions() == '' or 16 in self._board
+
+	def __str__(self):
+		s = ''
+		for r in range(0,16,4):
+			s += ' '.join(f'{2**x} '.rjust(5) for x in self._board[r:r+4]).replace(' 1 ','   ') + '\n'
+		s += f'Score = {self._score}'
+		return s
@@ -1,43 +1,64 @@
 from Game2048 import *
 
 class Player(BasePlayer):
-	def __init__(self, timeLimit):
+	def __init__(self, timeLimit, cutoff=1e-4):
 		BasePlayer.__init__(self, timeLimit)
 
+		# Positions reached with a lower spawn probability than this are
+		# scored without searching further
+		self._cutoff = cutoff
+		self._cutoffCount = 0
+		self._cutoffDepth = 0
+		# Number of cutoffs made with each number of plies left
+		self._cutoffDepths = {}
+
 		self._nodeCount = 0
 		self._parentCount = 0
 		self._childCount = 0
+		# Parents and children counted apart for max and min nodes
+		self._maxParents = 0
+		self._maxBranches = 0
+		self._minParents = 0
+		self._minBranches = 0
 		self._depthCount = 0
 		self._count = 0
 
 	def findMove(self, state):
 		self._count += 1
 		actions = self.moveOrder(state)
+		board = state.copy()
 		depth = 1
-		while self.timeRemaining():
-			self._depthCount += 1
-			self._parentCount += 1
-			self._nodeCount += 1
-			print('Search depth', depth)
-			best = -10000
-			for a in actions:
-				result = state.move(a)
-				if not self.timeRemaining(): return
-				v = self.minPlayer(result, depth-1)
-				if v is None: return
-				if v > best:
-					best = v
-					bestMove = a
-						
-			self.setMove(bestMove)
-			print('\tBest value', best, bestMove)
-
-			depth += 1
-
-	def maxPlayer(self, state, depth):
+		self.startClock()
+		try:
+			while self.timeRemaining():
+				self._depthCount += 1
+				self._parentCount += 1
+				self._maxParents += 1
+				self._nodeCount += 1
+				print('Search depth', depth)
+				best = -10000
+				for a in actions:
+					token = board.applyMove(a)
+					v = self.minPlayer(board, depth-1)
+					board.undo(token)
+					if v > best:
+						best = v
+						bestMove = a
+							
+				self.setMove(bestMove)
+				print('\tBest value', best, bestMove)
+
+				depth += 1
+		except SearchTimeout:
+			# The board is left part way down the tree, it is a copy
+			pass
+
+	def maxPlayer(self, state, depth, prob=1.0):
 		# The max player gets to choose the move
 		self._nodeCount += 1
 		self._childCount += 1
+		self._minBranches += 1
+		if self._nodeCount >= self._nextCheck: self.checkTime()
 
 		if state.gameOver():
 			return state.getScore()
@@ -47,22 +68,30 @@ class Player(BasePlayer):
 		if depth == 0:
 			return self.heuristic(state)
 
+		if prob < self._cutoff:
+			self._cutoffCount += 1
+			self._cutoffDepth += depth
+			self._cutoffDepths[depth] = self._cutoffDepths.get(depth, 0) + 1
+			return self.heuristic(state)
+
 		self._parentCount += 1
+		self._maxParents += 1
 		best = -10000
 		for a in actions:
-			if not self.timeRemaining(): return None
-			result = state.move(a)
-			v = self.minPlayer(result, depth-1)
-			if v is None: return None
+			token = state.applyMove(a)
+			v = self.minPlayer(state, depth-1, prob)
+			state.undo(token)
 			if v > best:
 				best = v
 				
 		return best
 
-	def minPlayer(self, state, depth):
+	def minPlayer(self, state, depth, prob=1.0):
 		# The min player chooses where to add the extra tile and whether it is a 2 or a 4
 		self._nodeCount += 1
 		self._childCount += 1
+		self._maxBranches += 1
+		if self._nodeCount >= self._nextCheck: self.checkTime()
 
 		if state.gameOver():
 			return state.getScore()
@@ -73,12 +102,14 @@ class Player(BasePlayer):
 			return self.heuristic(state)
 
 		self._parentCount += 1
+		self._minParents += 1
 		best = 1e6
-		for (t,v) in state.possibleTiles():
-			if not self.timeRemaining(): return None
-			result = state.addTile(t,v)
-			v = self.maxPlayer(result, depth-1)
-			if v is None: return None
+		# The path probability follows the spawn odds of the game being
+		# played, so the cutoff works the same on a Game2048Variant
+		for (t,v,p) in state.spawnDistribution():
+			state.placeTile(t,v)
+			v = self.maxPlayer(state, depth-1, prob * p)
+			state.removeTile(t)
 			if v < best:
 				best = v
 
@@ -93,3 +124,17 @@ class Player(BasePlayer):
 	def stats(self):
 		print(f'Average depth: {self._depthCount/self._count:.2f}')
 		print(f'Branching factor: {self._childCount / self._parentCount:.2f}')
+		print(f'Probability cutoffs: {self._cutoffCount:,} below {self._cutoff:g}, '
+			f'{self._cutoffDepth / max(self._cutoffCount, 1):.2f} plies left on average')
+		# A cut max node with d plies left skips the d plies below it,
+		# which alternate between the max and the min branching factors
+		maxBranching = self._maxBranches / max(self._maxParents, 1)
+		minBranching = self._minBranches / max(self._minParents, 1)
+		saved = 0
+		for d, n in self._cutoffDepths.items():
+			width = n
+			for k in range(d):
+				width *= maxBranching if k % 2 == 0 else minBranching
+				saved += width
+		print(f'Nodes saved by cutoffs: about {saved:,.0f} estimated, '
+			f'{saved / max(self._nodeCount, 1):.1f}x the nodes searched')
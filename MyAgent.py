@@ -1,42 +1,114 @@
 #Latest best one with grade 85
-from Game2048 import BasePlayer
+import time
+
+from Game2048 import BasePlayer, SearchTimeout
+import Heuristic
+from TranspositionTable import TranspositionTable, EXACT
 
 class Player(BasePlayer):
-    def __init__(self, timeLimit):
+    # mode 'minimax' treats the random tile as an adversary that picks the
+    # worst spawn, 'expectimax' averages over the spawns with their real odds,
+    # which come from the state, so a Game2048Variant's own odds are used.
+    # Positions whose chance of being reached, the product of the spawn
+    # probabilities on the path to them, is below cutoff are scored with the
+    # heuristic instead of searched further.
+    #
+    # Searched values are kept in a transposition table of at most
+    # tableBytes (0 for none).  Every value is the state's score plus a part
+    # that only depends on the board, so the table is keyed by the packed
+    # board and stores the value less the score.  The table is kept from
+    # move to move, so the positions searched below the move that was
+    # played are ready when the next search reaches them.
+    #
+    # The cutoffs depend on the path probability, so a value is only
+    # stored when no cutoff was made below it, and is stored with its path
+    # probability: reached again with a lower one, the search might cut.
+    def __init__(self, timeLimit, mode='minimax', cutoff=1e-4, tableBytes=32 << 20):
         BasePlayer.__init__(self, timeLimit)
         self._count = 0
         self._depthCount = 0
         self._nodeCount = 0
         self._parentCount = 0
         self._childCount = 0
+        # Parents and children counted apart for max and chance nodes
+        self._maxParents = 0
+        self._maxBranches = 0
+        self._chanceParents = 0
+        self._chanceBranches = 0
+        self._reachedDepth = 0
+        self._maxDepth = 0
+        self._searchTime = 0
+        self._cutoff = cutoff
+        self._cutoffCount = 0
+        self._cutoffDepth = 0
+        # Number of cutoffs made with each number of plies left
+        self._cutoffDepths = {}
+        self._table = TranspositionTable(tableBytes) if tableBytes else None
+        self._moveHitRates = []
+        self.setMode(mode)
+
+    def setMode(self, mode):
+        if mode == 'minimax':
+            self.chancePlayer = self.minPlayer
+        elif mode == 'expectimax':
+            self.chancePlayer = self.expectPlayer
+        else:
+            raise ValueError(f'Unknown search mode {mode}')
+        self._mode = mode
+        if self._table is not None:
+            self._table.clear()
+
+    def setCutoff(self, cutoff):
+        self._cutoff = cutoff
 
     def findMove(self, state):
         self._count += 1
+        start = time.time()
+        table = self._table
+        if table is not None:
+            table.newSearch()
+            probes = table.probes
+            hits = table.hits
+        depth = self.search(state)
+        self._searchTime += time.time() - start
+        if table is not None:
+            self._moveHitRates.append((table.hits - hits) / max(1, table.probes - probes))
+        self._reachedDepth += depth
+        self._maxDepth = max(self._maxDepth, depth)
+
+    def search(self, state):
+        # Iterative deepening, returns the deepest fully searched depth.  The
+        # players raise SearchTimeout when the time is up, which abandons
+        # the unfinished pass.
         actions = self.moveOrder(state)
         depth = 1
-        while self.timeRemaining():
-            self._depthCount += 1
-            self._parentCount += 1
-            self._nodeCount += 1
+        self.startClock()
+        try:
+            while self.timeRemaining():
+                self._depthCount += 1
+                self._parentCount += 1
+                self._maxParents += 1
+                self._nodeCount += 1
+
+                best = -float('inf')
+                for a, result, reward in actions:
+                    v = self.chancePlayer(result, depth - 1)
+                    if v > best:
+                        best = v
+                        bestMove = a
 
-            best = -float('inf')
-            for a in actions:
-                result = state.move(a)
-                if not self.timeRemaining():
-                    return
-                v = self.minPlayer(result, depth - 1)
-                if v is None:
-                    return
-                if v > best:
-                    best = v
-                    bestMove = a
-
-            self.setMove(bestMove)
-            depth += 1
+                self.setMove(bestMove)
+                depth += 1
+        except SearchTimeout:
+            pass
+        return depth - 1
 
-    def maxPlayer(self, state, depth):
+    def maxPlayer(self, state, depth, prob=1.0):
         self._nodeCount += 1
         self._childCount += 1
+        self._chanceBranches += 1
+        if self._nodeCount >= self._nextCheck:
+            self.checkTime()
 
         if state.gameOver():
             return state.getScore()
@@ -44,23 +116,38 @@ class Player(BasePlayer):
         if depth == 0:
             return self.heuristic(state)
 
+        if prob < self._cutoff:
+            self._cutoffCount += 1
+            self._cutoffDepth += depth
+            self._cutoffDepths[depth] = self._cutoffDepths.get(depth, 0) + 1
+            return self.heuristic(state)
+
+        table = self._table
+        if table is not None:
+            key = state._b << 1
+            entry = table.lookup(key, depth, prob)
+            if entry is not None and entry[1] == EXACT:
+                return entry[0] + state._score
+
         self._parentCount += 1
+        self._maxParents += 1
+        cuts = self._cutoffCount
         best = -float('inf')
-        for a in self.moveOrder(state):
-            if not self.timeRemaining():
-                return None
-            result = state.move(a)
-            v = self.minPlayer(result, depth - 1)
-            if v is None:
-                return None
+        for a, result, reward in self.moveOrder(state):
+            v = self.chancePlayer(result, depth - 1, prob)
             if v > best:
                 best = v
 
+        if table is not None and self._cutoffCount == cuts:
+            table.store(key, best - state._score, depth, EXACT, prob if self._cutoff else 0.0)
         return best
 
-    def minPlayer(self, state, depth):
+    def minPlayer(self, state, depth, prob=1.0):
         self._nodeCount += 1
         self._childCount += 1
+        self._maxBranches += 1
+        if self._nodeCount >= self._nextCheck:
+            self.checkTime()
 
         if state.gameOver():
             return state.getScore()
@@ -68,21 +155,63 @@ class Player(BasePlayer):
         if depth == 0:
             return self.heuristic(state)
 
+        table = self._table
+        if table is not None:
+            key = (state._b << 1) | 1
+            entry = table.lookup(key, depth, prob)
+            if entry is not None and entry[1] == EXACT:
+                return entry[0] + state._score
+
         self._parentCount += 1
+        self._chanceParents += 1
+        cuts = self._cutoffCount
         best = float('inf')
-        for t, v in state.possibleTiles():
-            if not self.timeRemaining():
-                return None
-            result = state.addTile(t, v)
-            val = self.maxPlayer(result, depth - 1)
-            if val is None:
-                return None
+        for t, v, p, result in state.chanceChildren():
+            val = self.maxPlayer(result, depth - 1, prob * p)
             if val < best:
                 best = val
 
+        if table is not None and self._cutoffCount == cuts:
+            table.store(key, best - state._score, depth, EXACT, prob if self._cutoff else 0.0)
         return best
 
+    def expectPlayer(self, state, depth, prob=1.0):
+        self._nodeCount += 1
+        self._childCount += 1
+        self._maxBranches += 1
+        if self._nodeCount >= self._nextCheck:
+            self.checkTime()
+
+        if state.gameOver():
+            return state.getScore()
+
+        if depth == 0:
+            return self.heuristic(state)
+
+        table = self._table
+        if table is not None:
+            key = (state._b << 1) | 1
+            entry = table.lookup(key, depth, prob)
+            if entry is not None and entry[1] == EXACT:
+                return entry[0] + state._score
+
+        self._parentCount += 1
+        self._chanceParents += 1
+        cuts = self._cutoffCount
+        total = 0
+        for t, v, p, result in state.chanceChildren():
+            val = self.maxPlayer(result, depth - 1, prob * p)
+            total += p * val
+
+        if table is not None and self._cutoffCount == cuts:
+            table.store(key, total - state._score, depth, EXACT, prob if self._cutoff else 0.0)
+        return total
+
     def heuristic(self, state):
+        # Table driven version of slowHeuristic, same value
+        return Heuristic.evaluate(state)
+
+    def slowHeuristic(self, state):
         score = state.getScore()
         empty = sum(1 for i in range(4) for j in range(4) if state.getTile(i, j) == 0)
         smoothness = self.calculateSmoothness(state)
@@ -151,10 +280,35 @@ class Player(BasePlayer):
         return merges
 
     def moveOrder(self, state):
-        return state.actions()
+        return state.afterstates()
 
     def stats(self):
+        print(f'Search mode: {self._mode}')
         print(f'Average depth: {self._depthCount/self._count:.2f}')
+        print(f'Reached depth: {self._reachedDepth/self._count:.2f} average, {self._maxDepth} max')
+        print(f'Nodes per second: {self._nodeCount / max(self._searchTime, 1e-9):,.0f}')
+        print(f'Probability cutoffs: {self._cutoffCount:,} below {self._cutoff:g}, '
+            f'{self._cutoffDepth / max(self._cutoffCount, 1):.2f} plies left on average')
+        # A cut max node with d plies left skips the d plies below it,
+        # which alternate between the max and the chance branching factors
+        maxBranching = self._maxBranches / max(self._maxParents, 1)
+        chanceBranching = self._chanceBranches / max(self._chanceParents, 1)
+        saved = 0
+        for d, n in self._cutoffDepths.items():
+            width = n
+            for k in range(d):
+                width *= maxBranching if k % 2 == 0 else chanceBranching
+                saved += width
+        print(f'Nodes saved by cutoffs: about {saved:,.0f} estimated, '
+            f'{saved / max(self._nodeCount, 1):.1f}x the nodes searched')
+        table = self._table
+        if table is not None:
+            rates = self._moveHitRates
+            print(f'Transposition table: {table.hitRate():.1%} hit rate, {table.hits:,} hits, '
+                f'{table.replaced:,} replaced, {len(table):,} of {table.capacity():,} entries')
+            if rates:
+                print(f'Hit rate per move: {min(rates):.1%} min, {sum(rates)/len(rates):.1%} average, '
+                    f'{max(rates):.1%} max, {rates[-1]:.1%} last')
         print(f'Branching factor: {self._childCount / self._parentCount:.2f}')
 
 
@@ -2,8 +2,12 @@ from Game2048 import *
 
 import sys, importlib, argparse, time
 
-def play(agent, graphicsSize, delay):
-	state = Game2048()
+def play(agent, graphicsSize, delay, seed=None, trajectory=None, newGame=Game2048):
+	# newGame() makes the empty starting state, Game2048 unless another
+	# engine or a variant was asked for
+	state = newGame()
+	if seed is not None:
+		state.setSeed(seed)
 	state.randomize()
 	if g is not None:
 		g.draw(state)
@@ -19,7 +23,10 @@ def play(agent, graphicsSize, delay):
 		print(f'Players moves {move}\n')
 		print()
 		
+		oldState = state
 		state, reward = state.result(move)
+		if trajectory is not None:
+			trajectory.record(oldState, move, state, reward)
 
 		if g is not None:
 			g.draw(state)
@@ -28,6 +35,8 @@ def play(agent, graphicsSize, delay):
 			time.sleep(delay)
 			
 	print(state)
+	if trajectory is not None:
+		trajectory.endGame(state)
 
 if __name__ == '__main__':
 	parser = argparse.ArgumentParser(description ='Play Othello')
@@ -36,8 +45,29 @@ if __name__ == '__main__':
 	parser.add_argument('-g', type=int, help="size of graphics window")
 	parser.add_argument('-t', type=float, help="time delay")
 	parser.add_argument('-d', type=str, help="data file")
+	parser.add_argument('-s', type=int, help="random seed, replays the same tiles for every agent")
+	parser.add_argument('-r', type=str, help="trajectory file to append the game to")
+	parser.add_argument('-m', type=str, help="search mode for agents that have one, e.g. expectimax")
+	parser.add_argument('-n', type=int, help="board size, plays a Game2048Variant")
+	parser.add_argument('-f', type=float, help="chance that a new tile is a 4, plays a Game2048Variant")
+	parser.add_argument('-w', type=int, help="winning tile, e.g. 2048, plays a Game2048Variant")
+	parser.add_argument('-l', action='store_true', help="play on the list based reference engine")
 	args = parser.parse_args()
 
+	newGame = Game2048
+	if args.l:
+		from ListGame2048 import ListGame2048
+		newGame = ListGame2048
+	if args.n is not None or args.f is not None or args.w is not None:
+		from Game2048Variant import Game2048Variant, Rules
+		four = .25 if args.f is None else args.f
+		win = Bitboard.WIN_TILE if args.w is None else args.w.bit_length() - 1
+		rules = Rules(args.n or 4, ((1, 1 - four), (2, four)), win)
+		newGame = lambda: Game2048Variant(rules)
+		if args.g or args.r:
+			print('Graphics and trajectory files need the standard 4x4 game')
+			sys.exit()
+
 	try:
 		agentModule = importlib.import_module(args.agent.split('.')[0])
 	except:
@@ -46,6 +76,15 @@ if __name__ == '__main__':
 
 	timeLimit = args.time_limit
 	agent = agentModule.Player(timeLimit)
+	if args.m:
+		if not hasattr(agent, 'setMode'):
+			print(f'Agent {args.agent} has no search modes, -m cannot be used')
+			sys.exit()
+		try:
+			agent.setMode(args.m)
+		except ValueError as e:
+			print(e)
+			sys.exit()
 
 	if args.g:
 		from Graphics import *
@@ -56,4 +95,9 @@ if __name__ == '__main__':
 	if args.d:
 		agent.loadData(args.d)
 
-	play(agent, g, args.t)
+	if args.r:
+		from Trajectory import TrajectoryWriter
+		with TrajectoryWriter(args.r) as trajectory:
+			play(agent, g, args.t, args.s, trajectory, newGame)
+	else:
+		play(agent, g, args.t, args.s, newGame=newGame)
@@ -0,0 +1,124 @@
+import random
+
+import Bitboard
+
+# Monte-Carlo playouts from a position.  The playout loop runs on packed
+# boards with the Bitboard tables and never builds a Game2048, so one core
+# manages a few hundred thousand moves per second.  With batch=True the
+# random playouts are run side by side on the NumPy engine instead.
+#
+# A policy is called as policy(board, legal, rng) with the packed board
+# and its legal move mask and returns an action letter.  The default picks
+# uniformly among the legal moves.
+
+_MOVES = [ Bitboard.MOVES[a] for a in 'UDLR' ]
+
+class RolloutResult:
+	def __init__(self, scores, maxTiles, lengths):
+		self.scores = scores
+		self.maxTiles = maxTiles
+		self.lengths = lengths
+
+	def meanScore(self):
+		return sum(self.scores) / len(self.scores)
+
+	def meanLength(self):
+		return sum(self.lengths) / len(self.lengths)
+
+	def maxTileCounts(self):
+		# {tile exponent: number of playouts that ended with it as the max}
+		counts = {}
+		for t in self.maxTiles:
+			counts[t] = counts.get(t, 0) + 1
+		return counts
+
+	def __str__(self):
+		tiles = ', '.join(f'{2**t}: {n}' for t, n in sorted(self.maxTileCounts().items()))
+		return (f'{len(self.scores)} playouts, mean score {self.meanScore():.1f}, '
+			f'mean length {self.meanLength():.1f}, max tiles {{{tiles}}}')
+
+def _maxTile(b):
+	m = 0
+	while b:
+		if b & 0xF > m:
+			m = b & 0xF
+		b >>= 4
+	return m
+
+def _playout(b, score, policy, rng, maxMoves):
+	legalMoves = Bitboard.legalMoves
+	zeroNibbles = Bitboard.zeroNibbles
+	rand = rng.random
+	steps = 0
+	while steps < maxMoves:
+		if policy is None:
+			# Draw moves until one changes the board, which is uniform over
+			# the legal moves without computing the legal mask first
+			tried = 0
+			while tried != 15:
+				a = int(rand() * 4)
+				if tried >> a & 1:
+					continue
+				after, gained = _MOVES[a](b)
+				if after != b:
+					break
+				tried |= 1 << a
+			else:
+				break
+		else:
+			legal = legalMoves(b)
+			if legal == 0:
+				break
+			a = 'UDLR'.index(policy(b, legal, rng))
+			after, gained = _MOVES[a](b)
+		score += gained
+		steps += 1
+		if gained >= 65536 and Bitboard.movesToWin(b, 'UDLR'[a]):
+			b = after
+			break
+
+		# Spawn on a uniformly chosen empty cell
+		empty = zeroNibbles(after)
+		for i in range(int(rand() * empty.bit_count())):
+			empty &= empty - 1
+		cell = empty & -empty
+		b = after | (cell << 1 if rand() < .25 else cell)
+	return b, score, steps
+
+def rollouts(state, count, policy=None, rng=None, maxMoves=100000, batch=False):
+	# Plays count games to the end from state and returns a RolloutResult
+	if batch and policy is None:
+		return _batchRollouts(state, count, rng, maxMoves)
+	if rng is None:
+		rng = random.Random()
+	scores = []
+	maxTiles = []
+	lengths = []
+	if state.gameOver():
+		return RolloutResult([state.getScore()] * count, [_maxTile(state._b)] * count, [0] * count)
+	for k in range(count):
+		b, score, steps = _playout(state._b, state.getScore(), policy, rng, maxMoves)
+		scores.append(score)
+		maxTiles.append(_maxTile(b))
+		lengths.append(steps)
+	return RolloutResult(scores, maxTiles, lengths)
+
+def _batchRollouts(state, count, rng, maxMoves):
+	import numpy as np
+	import Batch2048
+
+	if rng is None:
+		rng = np.random.default_rng()
+	games = Batch2048.BatchGame2048.fromGames([state] * count, rng)
+	lengths = np.zeros(count, dtype=np.int64)
+	playing = ~games.gameOver()
+	steps = 0
+	while playing.any() and steps < maxMoves:
+		actions = Batch2048.randomLegalActions(games.legalMask(), rng)
+		actions[~playing] = -1
+		games.result(actions)
+		lengths += playing
+		playing &= ~games.gameOver()
+		steps += 1
+	maxTiles = games._boards.max(axis=1)
+	return RolloutResult(games.getScores().tolist(), maxTiles.tolist(), lengths.tolist())
@@ -0,0 +1,99 @@
+import mmap
+import struct
+
+from Game2048 import Game2048
+
+# Binary trajectory files.  A 16 byte header is followed by fixed width
+# 14 byte records, so games can be appended while they are played and a
+# finished file can be memory mapped and indexed directly.
+#
+#   header  magic b'2048TRJ', version byte, record size (uint16), padding
+#   record  packed board before the move (uint64)
+#           action (uint8, index into 'UDLR', END for the end of a game)
+#           spawn (uint8, cell << 4 | tile exponent, NO_SPAWN if none)
+#           reward (uint32)
+#
+# Every game ends with an END record holding its final board, so a file
+# can hold any number of games back to back.
+
+MAGIC = b'2048TRJ'
+VERSION = 1
+HEADER = struct.Struct('<7sBH6x')
+RECORD = struct.Struct('<QBBI')
+
+ACTIONS = 'UDLR'
+END = 0xFF
+NO_SPAWN = 0xFF
+
+def _spawn(after, state):
+	# Cell and tile that the random spawn added to the afterstate
+	diff = after._b ^ state._b
+	if diff == 0:
+		return NO_SPAWN
+	cell = (diff.bit_length() - 1) // 4
+	return (cell << 4) | state.getTile(cell // 4, cell % 4)
+
+class TrajectoryWriter:
+	def __init__(self, filename):
+		self._file = open(filename, 'ab')
+		if self._file.tell() == 0:
+			self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+
+	def record(self, state, action, nextState, reward):
+		# One move: state.result(action) returned (nextState, reward)
+		spawn = _spawn(state.move(action), nextState)
+		self._file.write(RECORD.pack(state._b, ACTIONS.index(action), spawn, reward))
+
+	def endGame(self, state):
+		self._file.write(RECORD.pack(state._b, END, NO_SPAWN, 0))
+		self._file.flush()
+
+	def close(self):
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+def _checkHeader(data):
+	magic, version, size = HEADER.unpack_from(data)
+	if magic != MAGIC or version != VERSION or size != RECORD.size:
+		raise ValueError('Not a version 1 trajectory file')
+
+def readRecords(filename):
+	# Yields (board, action, spawn, reward) tuples straight from the mapped
+	# file, with the raw field values described above
+	with open(filename, 'rb') as dataFile:
+		with mmap.mmap(dataFile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			_checkHeader(data)
+			end = HEADER.size + (len(data) - HEADER.size) // RECORD.size * RECORD.size
+			for offset in range(HEADER.size, end, RECORD.size):
+				yield RECORD.unpack_from(data, offset)
+
+def readGames(filename):
+	# Yields each game as a list of (state, action, reward) with the final
+	# state last and action None
+	game = []
+	score = 0
+	for board, action, spawn, reward in readRecords(filename):
+		if action == END:
+			game.append((Game2048(board, score), None, 0))
+			yield game
+			game = []
+			score = 0
+		else:
+			game.append((Game2048(board, score), ACTIONS[action], reward))
+			score += reward
+
+def recordArray(filename):
+	# The records as a read only numpy structured array on top of the file
+	import numpy as np
+	dtype = np.dtype([('board', '<u8'), ('action', 'u1'), ('spawn', 'u1'), ('reward', '<u4')])
+	with open(filename, 'rb') as dataFile:
+		_checkHeader(dataFile.read(HEADER.size))
+		count = (dataFile.seek(0, 2) - HEADER.size) // RECORD.size
+	if count == 0:
+		return np.zeros(0, dtype=dtype)
+	return np.memmap(filename, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
@@ -0,0 +1,90 @@
+# Fixed size transposition table for the search agents.
+#
+# Entries are (key, value, depth searched, bound, age) held in parallel
+# lists, so the table never grows past the size chosen up front.  Slots
+# come in pairs: the first keeps the entry with the deepest search, the
+# second takes whatever was stored last, so deep results survive a flood
+# of shallow ones and recent positions are still found.
+#
+# A table can be kept from one move to the next.  newSearch() starts a new
+# age; entries from earlier searches are still found, but the deepest
+# search slot gives them up to anything stored by the current search.
+#
+# The bound says what the value is: EXACT, or LOWER/UPPER when the search
+# was cut short by a window and the true value is at least/at most it.
+#
+# An entry can also carry the path probability it was searched with, for
+# searches that stop below a probability cutoff.  It is only found again
+# by lookups with at least that probability, which cut nothing more.
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Rough memory per entry: six list slots plus the key int and value and
+# probability floats
+ENTRY_BYTES = 136
+
+class TranspositionTable:
+	def __init__(self, maxBytes=32 << 20):
+		# An odd bucket count spreads the packed boards, whose low bits
+		# are often alike, over all the buckets
+		self._buckets = max(1, maxBytes // ENTRY_BYTES // 2) | 1
+		self.probes = 0
+		self.hits = 0
+		self.stores = 0
+		self.replaced = 0
+		self._age = 0
+		self.clear()
+
+	def clear(self):
+		n = 2 * self._buckets
+		self._keys = [None] * n
+		self._values = [0] * n
+		self._depths = [0] * n
+		self._bounds = [EXACT] * n
+		self._ages = [0] * n
+		self._probs = [0.0] * n
+
+	def newSearch(self):
+		self._age += 1
+
+	def __len__(self):
+		return len(self._keys) - self._keys.count(None)
+
+	def capacity(self):
+		return len(self._keys)
+
+	def lookup(self, key, depth, prob=1.0):
+		# (value, bound) stored for key from a search at least depth deep
+		# with at most path probability prob, or None
+		self.probes += 1
+		i = 2 * (key % self._buckets)
+		keys = self._keys
+		if keys[i] != key or self._depths[i] < depth or self._probs[i] > prob:
+			i += 1
+			if keys[i] != key or self._depths[i] < depth or self._probs[i] > prob:
+				return None
+		self.hits += 1
+		return self._values[i], self._bounds[i]
+
+	def store(self, key, value, depth, bound=EXACT, prob=0.0):
+		self.stores += 1
+		i = 2 * (key % self._buckets)
+		keys = self._keys
+		old = keys[i]
+		if old is not None and old != key and self._depths[i] > depth and self._ages[i] == self._age:
+			# Keep the deeper entry and use the always replace slot
+			i += 1
+			old = keys[i]
+		if old is not None and old != key:
+			self.replaced += 1
+		keys[i] = key
+		self._values[i] = value
+		self._depths[i] = depth
+		self._bounds[i] = bound
+		self._ages[i] = self._age
+		self._probs[i] = prob
+
+	def hitRate(self):
+		return self.hits / max(1, self.probes)